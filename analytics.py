@@ -0,0 +1,92 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import HTMLResponse
+from utils.templating import templates
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.db_depends import get_db
+from models import Inventory, InventoryAdjustment, Item, Category
+
+router = APIRouter(prefix="/analytics", tags=["Analytics"])
+
+# Проведённая инвентаризация больше не меняется, поэтому её сводка кэшируется без срока жизни.
+# Кэшируются не строки, а агрегаты (итоги, недостача по категориям, отклонения по товарам) —
+# они малы, и держать их можно для всех проведённых инвентаризаций
+inventory_summaries = {}
+
+
+# Сводки проведённых инвентаризаций: из кэша, недостающие — двумя запросами. Итоги по категориям
+# считает БД; отклонения по товарам берутся строками: товар встречается в инвентаризации один раз
+async def load_inventory_summaries(db: AsyncSession, inv_ids: list[int]) -> dict:
+    from utils import variance
+
+    missing = [inv_id for inv_id in inv_ids if inv_id not in inventory_summaries]
+    if missing:
+        counted = (InventoryAdjustment.inventory_id.in_(missing), InventoryAdjustment.difference != 0)
+        value = InventoryAdjustment.difference * InventoryAdjustment.price
+        category_rows = await db.execute(
+            select(
+                InventoryAdjustment.inventory_id,
+                InventoryAdjustment.category_id,
+                func.sum(func.abs(func.least(value, 0))),
+                func.sum(value),
+                func.count()
+            )
+            .where(*counted)
+            .group_by(InventoryAdjustment.inventory_id, InventoryAdjustment.category_id)
+        )
+        item_rows = await db.execute(
+            select(InventoryAdjustment.inventory_id, InventoryAdjustment.item_id, InventoryAdjustment.difference, value)
+            .where(*counted, InventoryAdjustment.item_id.isnot(None))
+        )
+        inventory_summaries.update(variance.build_summaries(missing, category_rows.all(), item_rows.all()))
+
+    return {inv_id: inventory_summaries[inv_id] for inv_id in inv_ids}
+
+
+@router.get("/", response_class=HTMLResponse)
+async def analytics_dashboard(request: Request, db: AsyncSession = Depends(get_db)):
+    from utils import variance
+
+    result = await db.execute(
+        select(Inventory.id, Inventory.finalized_at)
+        .where(Inventory.finalized_at.isnot(None))
+        .order_by(Inventory.finalized_at)
+    )
+    inventories = [{"id": inv_id, "finalized_at": finalized_at} for inv_id, finalized_at in result.all()]
+    inv_ids = [inv["id"] for inv in inventories]
+
+    summaries = await load_inventory_summaries(db, inv_ids)
+
+    cat_result = await db.execute(select(Category.id, Category.name))
+    category_names = dict(cat_result.all())
+
+    trend = variance.inventory_trend(summaries, inventories)
+    chronic = variance.chronic_items(summaries, inv_ids)
+
+    chronic_rows = []
+    if not chronic.empty:
+        item_ids = [int(item_id) for item_id in chronic.index]
+        name_result = await db.execute(select(Item.id, Item.name).where(Item.id.in_(item_ids)))
+        item_names = dict(name_result.all())
+        for item_id, row in zip(item_ids, chronic.itertuples()):
+            chronic_rows.append({
+                "id": item_id,
+                "name": item_names.get(item_id, "Удалённый товар"),
+                "inventories": int(row.inventories),
+                "difference": int(row.difference),
+                "value": float(row.value),
+            })
+
+    return templates.TemplateResponse(
+        "analytics.html",
+        {
+            "request": request,
+            "trend": trend,
+            "categories": variance.category_trends(summaries, inv_ids, category_names),
+            "chronic": chronic_rows,
+            "chronic_window": variance.CHRONIC_WINDOW,
+            "chronic_min": variance.CHRONIC_MIN_INVENTORIES,
+            "risk": variance.value_at_risk(trend),
+            "var_level": variance.VAR_LEVEL,
+        }
+    )
@@ -0,0 +1,237 @@
+from collections import Counter
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from database.db_depends import get_db
+from models import Item, Category, Inventory, InventoryItem, Log, ActionType, User
+from auth import get_current_user
+from home import filter_items
+from logs import logs_query
+from utils.stock import stock_change_points, record_stock_points
+from categories import get_category_tree, get_category_path
+from schemas import (ItemPage, ItemOut, ItemBulkWrite, ItemBulkResult, CategoryOut, InventoryPage,
+                     InventoryLinePage, LogPage)
+
+# Ответы собираются из строк запроса и сериализуются orjson напрямую, без построения
+# Pydantic-объектов на каждую строку; модели описывают ответы для OpenAPI
+router = APIRouter(prefix="/api/v1", tags=["API v1"], default_response_class=ORJSONResponse)
+
+MAX_PAGE = 1000
+
+ITEM_FIELDS = {
+    "id": Item.id,
+    "name": Item.name,
+    "description": Item.description,
+    "quantity": Item.quantity,
+    "price": Item.price,
+    "category_id": Item.category_id,
+    "version": Item.version,
+}
+
+
+# Разбор ?fields=id,name — id нужен всегда, по нему идёт пагинация
+def parse_item_fields(fields: Optional[str]):
+    if not fields:
+        return list(ITEM_FIELDS)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in ITEM_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Неизвестные поля: {', '.join(unknown)}")
+    return ["id"] + [name for name in dict.fromkeys(names) if name != "id"]
+
+
+def parse_ids(ids: str):
+    try:
+        parsed = list(dict.fromkeys(int(value) for value in ids.split(",") if value.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids должны быть числами через запятую")
+    if len(parsed) > MAX_PAGE:
+        raise HTTPException(status_code=400, detail=f"Не больше {MAX_PAGE} id за запрос")
+    return parsed
+
+
+def rows_to_dicts(keys, rows):
+    return [dict(zip(keys, row)) for row in rows]
+
+
+# Товары постранично по id (keyset): ?after_id=<последний id предыдущей страницы>
+@router.get("/items", response_model=ItemPage)
+async def list_items(
+    fields: Optional[str] = Query(None),
+    search: Optional[str] = Query(None),
+    category_id: Optional[int] = Query(None),
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE),
+    db: AsyncSession = Depends(get_db)
+):
+    keys = parse_item_fields(fields)
+    category_path = await get_category_path(db, category_id)
+    if category_id and category_path is None:
+        raise HTTPException(status_code=404, detail="Категория не найдена")
+    query = filter_items(select(*[ITEM_FIELDS[key] for key in keys]), search, category_path)
+    result = await db.execute(query.where(Item.id > after_id).order_by(Item.id).limit(limit))
+    items = rows_to_dicts(keys, result.all())
+
+    return ORJSONResponse({
+        "items": items,
+        "next_after_id": items[-1]["id"] if len(items) == limit else None
+    })
+
+
+# Пакетное чтение по списку id: ?ids=1,2,3
+@router.get("/items/batch", response_model=list[ItemOut])
+async def get_items_batch(
+    ids: str = Query(...),
+    fields: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_db)
+):
+    keys = parse_item_fields(fields)
+    item_ids = parse_ids(ids)
+    if not item_ids:
+        return ORJSONResponse([])
+
+    result = await db.execute(
+        select(*[ITEM_FIELDS[key] for key in keys]).where(Item.id.in_(item_ids)).order_by(Item.id)
+    )
+    return ORJSONResponse(rows_to_dicts(keys, result.all()))
+
+
+# Пакетная запись: строки без id создаются, с id — обновляются; всё в одной транзакции
+@router.post("/items/bulk", response_model=ItemBulkResult)
+async def bulk_write_items(
+    payload: ItemBulkWrite,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    new_rows = [item.model_dump(exclude={"id"}) for item in payload.items if item.id is None]
+    # В обновление идут только присланные поля: неуказанные описание и категория не затираются
+    updates = [item.model_dump(exclude_unset=True) for item in payload.items if item.id is not None]
+
+    category_ids = {item.category_id for item in payload.items if item.category_id is not None}
+    if category_ids:
+        found = set((await db.execute(select(Category.id).where(Category.id.in_(category_ids)))).scalars())
+        if category_ids - found:
+            raise HTTPException(status_code=400, detail=f"Категории не найдены: {sorted(category_ids - found)}")
+
+    if updates:
+        update_ids = {row["id"] for row in updates}
+        # Дубликаты дали бы два изменения истории остатков от одного и того же старого значения
+        if len(update_ids) != len(updates):
+            counts = Counter(row["id"] for row in updates)
+            duplicates = sorted(item_id for item_id, count in counts.items() if count > 1)
+            raise HTTPException(status_code=400, detail=f"Товары повторяются в запросе: {duplicates}")
+        found = set((await db.execute(select(Item.id).where(Item.id.in_(update_ids)))).scalars())
+        if update_ids - found:
+            raise HTTPException(status_code=404, detail=f"Товары не найдены: {sorted(update_ids - found)}")
+
+    paths = {cat["id"]: cat["path"] for cat in await get_category_tree(db)}
+    old_stock = {}
+    if updates:
+        result = await db.execute(
+            select(Item.id, Item.quantity, Item.price, Item.category_id).where(Item.id.in_(update_ids))
+        )
+        old_stock = {
+            item_id: {"quantity": quantity, "price": price, "category_id": cat_id}
+            for item_id, quantity, price, cat_id in result.all()
+        }
+
+    created = []
+    if new_rows:
+        result = await db.execute(insert(Item).returning(Item.id, sort_by_parameter_order=True), new_rows)
+        created = list(result.scalars().all())
+    if updates:
+        await db.execute(update(Item), updates)
+
+    points = []
+    for item_id, row in [*zip(created, new_rows), *((row["id"], row) for row in updates)]:
+        before = old_stock.get(item_id)
+        after = {**(before or {}), **row}
+        old = (before["quantity"], before["price"], paths.get(before["category_id"])) if before else None
+        new = (after["quantity"], after["price"], paths.get(after["category_id"]))
+        points.extend(stock_change_points(item_id, old, new))
+    await record_stock_points(db, points)
+
+    db.add(Log(
+        user_id=current_user.id,
+        action=ActionType.UPDATE,
+        description=(
+            f"Пользователь {current_user.name} загрузил товары через API: "
+            f"создано {len(created)}, обновлено {len(updates)}"
+        )
+    ))
+    await db.commit()
+
+    return ORJSONResponse({"created": created, "updated": len(updates)})
+
+
+@router.get("/categories", response_model=list[CategoryOut])
+async def list_categories(db: AsyncSession = Depends(get_db)):
+    return ORJSONResponse(await get_category_tree(db))
+
+
+@router.get("/inventories", response_model=InventoryPage)
+async def list_inventories(
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE),
+    db: AsyncSession = Depends(get_db)
+):
+    keys = ["id", "created_at", "created_by", "finalized_at", "finalized_by"]
+    result = await db.execute(
+        select(Inventory.id, Inventory.created_at, Inventory.created_by, Inventory.finalized_at,
+               Inventory.finalized_by)
+        .where(Inventory.id > after_id)
+        .order_by(Inventory.id)
+        .limit(limit)
+    )
+    inventories = rows_to_dicts(keys, result.all())
+    return ORJSONResponse({
+        "inventories": inventories,
+        "next_after_id": inventories[-1]["id"] if len(inventories) == limit else None
+    })
+
+
+@router.get("/inventories/{inv_id}/lines", response_model=InventoryLinePage)
+async def list_inventory_lines(
+    inv_id: int,
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(MAX_PAGE, ge=1, le=MAX_PAGE),
+    db: AsyncSession = Depends(get_db)
+):
+    if not await db.get(Inventory, inv_id):
+        raise HTTPException(status_code=404, detail="Инвентаризация не найдена")
+
+    keys = ["id", "item_id", "expected_qty", "actual_qty", "difference"]
+    result = await db.execute(
+        select(InventoryItem.id, InventoryItem.item_id, InventoryItem.expected_qty, InventoryItem.actual_qty,
+               InventoryItem.difference)
+        .where(InventoryItem.inventory_id == inv_id, InventoryItem.id > after_id)
+        .order_by(InventoryItem.id)
+        .limit(limit)
+    )
+    lines = rows_to_dicts(keys, result.all())
+    return ORJSONResponse({
+        "lines": lines,
+        "next_after_id": lines[-1]["id"] if len(lines) == limit else None
+    })
+
+
+# Журнал от новых к старым: ?before_id=<последний id предыдущей страницы>
+@router.get("/logs", response_model=LogPage)
+async def list_logs(
+    user_id: Optional[int] = Query(None),
+    item_id: Optional[int] = Query(None),
+    before_id: Optional[int] = Query(None, ge=1),
+    limit: int = Query(100, ge=1, le=MAX_PAGE),
+    db: AsyncSession = Depends(get_db)
+):
+    keys = ["id", "user_id", "item_id", "action", "description", "timestamp"]
+    query = select(Log.id, Log.user_id, Log.item_id, Log.action, Log.description, Log.timestamp)
+    result = await db.execute(logs_query(query, user_id, item_id, before_id, limit))
+    logs = rows_to_dicts(keys, result.all())
+    return ORJSONResponse({
+        "logs": logs,
+        "next_before_id": logs[-1]["id"] if len(logs) == limit else None
+    })
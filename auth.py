@@ -1,26 +1,29 @@
+import asyncio
 import os
+from functools import lru_cache
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
 from fastapi import Depends, HTTPException, status, Request, Response, Form
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from jose import jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from database.db_depends import get_db
 from models import User
 from fastapi import APIRouter
 from fastapi.responses import RedirectResponse
+from utils.admission import login_limit
+from utils.tokens import SECRET_KEY, ALGORITHM, get_token, decode_token
 
-load_dotenv()
 DISABLE_AUTH = os.getenv("DISABLE_AUTH", "false").lower() == "true"
-SECRET_KEY = os.getenv("SECRET_KEY")
-if not SECRET_KEY:
-    raise ValueError("SECRET_KEY is not set in environment variables")
-
-ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# passlib/bcrypt подгружаются при первом входе или создании пользователя, а не при старте
+@lru_cache
+def get_pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
 router = APIRouter()
 
 
@@ -28,17 +31,13 @@ async def get_current_user(
     request: Request,
     db: AsyncSession = Depends(get_db)
 ) -> User:
-    token = request.cookies.get("access_token")
+    token = get_token(request)
 
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
 
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    except JWTError:
+    username = decode_token(token)
+    if username is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
     result = await db.execute(select(User).where(User.name == username))
@@ -62,28 +61,25 @@ def create_access_token(data: dict):
 async def authenticate_user(db: AsyncSession, username: str, password: str):
     result = await db.execute(select(User).where(User.name == username))
     user = result.scalars().first()
-    if not user or not pwd_context.verify(password, user.hashed_password):
+    # bcrypt намеренно медленный — проверяем в потоке, чтобы не блокировать остальные запросы
+    if not user or not await asyncio.to_thread(get_pwd_context().verify, password, user.hashed_password):
         return None
     return user
 
 
 async def verify_auth(request: Request, db: AsyncSession = Depends(get_db)):
-    token = request.cookies.get("access_token")
+    token = get_token(request)
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
 
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    except JWTError:
+    username = decode_token(token)
+    if username is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
     return username
 
 
-@router.post("/login")
+@router.post("/login", dependencies=[Depends(login_limit)])
 async def login_for_access_token(
     request: Request,
     response: Response,
@@ -0,0 +1,163 @@
+# Проверка схемы и планов горячих запросов на отдельной (пустой) базе.
+# Подготовка: POSTGRES_DB=<тестовая база> alembic upgrade head
+# Запуск:     POSTGRES_DB=<тестовая база> python -m benchmarks.explain_hot_queries   (код выхода 1 — регрессия)
+#
+# 1. Схема после миграций совпадает с models.py (то же, что alembic check).
+# 2. Таблицы заполняются синтетическими данными, после ANALYZE каждый горячий запрос
+#    проходит через EXPLAIN; последовательное чтение большой таблицы считается регрессией.
+# Всё выполняется в одной транзакции и откатывается.
+import asyncio
+import json
+import sys
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import text, func
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.future import select
+from database.db import engine, Base
+from models import Item, Category, Inventory, InventoryItem, Log
+from home import filter_items
+from logs import logs_query, LOGS_PAGE_SIZE
+from categories import subtree_ids
+from inventory import inventories_query, INVENTORY_PAGE_SIZE
+from sync import changes_query
+
+ROOTS = 20
+CHILDREN = 100
+ITEMS = 100_000
+LOGS = 200_000
+INVENTORIES = 3_000
+LINES_PER_INVENTORY = 100
+
+SEED = [
+    "INSERT INTO users (name, post, hashed_password, is_active, is_admin) "
+    "SELECT 'explain_user_' || g, 'test', '', true, false FROM generate_series(1, 50) g",
+    f"INSERT INTO categories (name, path, depth) SELECT 'explain_root_' || g, '/', 0 FROM generate_series(1, {ROOTS}) g",
+    "UPDATE categories SET path = '/' || id || '/' WHERE name LIKE 'explain_root_%'",
+    f"INSERT INTO categories (name, parent_id, path, depth) "
+    f"SELECT 'explain_child_' || g, c.id, c.path, 1 FROM categories c, generate_series(1, {CHILDREN}) g "
+    f"WHERE c.name LIKE 'explain_root_%'",
+    "UPDATE categories SET path = path || id || '/' WHERE name LIKE 'explain_child_%'",
+    f"INSERT INTO items (name, description, quantity, price, category_id) "
+    f"SELECT 'explain_item_' || g, '', g % 500, g % 1000, "
+    f"(SELECT array_agg(id) FROM categories WHERE depth = 1)[1 + g % {ROOTS * CHILDREN}] "
+    f"FROM generate_series(1, {ITEMS}) g",
+    f"INSERT INTO logs (user_id, item_id, action, description, timestamp) "
+    f"SELECT u.ids[1 + g % 50], i.ids[1 + g % {ITEMS}], 'UPDATE', 'explain', now() - g * interval '1 minute' "
+    f"FROM generate_series(1, {LOGS}) g, "
+    f"(SELECT array_agg(id) ids FROM users WHERE name LIKE 'explain_user_%') u, "
+    f"(SELECT array_agg(id) ids FROM items WHERE name LIKE 'explain_item_%') i",
+    f"INSERT INTO inventories (created_at, created_by) "
+    f"SELECT now() - g * interval '1 day', (SELECT min(id) FROM users WHERE name LIKE 'explain_user_%') "
+    f"FROM generate_series(1, {INVENTORIES}) g",
+    f"INSERT INTO inventory_items (inventory_id, item_id, expected_qty) "
+    f"SELECT inv.id, i.ids[1 + (inv.id * {LINES_PER_INVENTORY} + g) % {ITEMS}], 0 "
+    f"FROM inventories inv, generate_series(1, {LINES_PER_INVENTORY}) g, "
+    f"(SELECT array_agg(id) ids FROM items WHERE name LIKE 'explain_item_%') i",
+    "ANALYZE",
+]
+
+# Таблицы, которые в этой проверке заведомо маленькие: по ним Seq Scan допустим
+SMALL_TABLES = {"users"}
+
+
+def compile_query(query) -> str:
+    return str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+async def sample(conn, query):
+    return (await conn.execute(query)).scalar()
+
+
+# Горячие запросы в том виде, в каком их строят обработчики
+async def hot_queries(conn):
+    # Зона (корень) для постраничных запросов и конечная категория для запроса без LIMIT:
+    # у зоны двадцатая часть всех товаров, и для неё последовательное чтение — честный план
+    zone_path = await sample(conn, select(Category.path).where(Category.depth == 0).limit(1))
+    leaf_path = await sample(conn, select(Category.path).where(Category.depth == 1).limit(1))
+    user_id = await sample(conn, select(Log.user_id).limit(1))
+    item_id = await sample(conn, select(Log.item_id).limit(1))
+    inventory_id = await sample(conn, select(func.max(Inventory.id)))
+    # Курсоры — последние записи первых страниц
+    before_id = await sample(conn, logs_query(select(Log.id)).offset(LOGS_PAGE_SIZE - 1))
+    before_inventory_id = await sample(conn, inventories_query(select(Inventory.id)).offset(INVENTORY_PAGE_SIZE - 1))
+    # Все строки заполнены одной транзакцией — худший случай для курсора синхронизации:
+    # сотня тысяч строк с одним txid, курсор где-то в их середине
+    sync_txid = await sample(conn, select(func.max(Item.txid)))
+    sync_version = await sample(conn, select(func.max(Item.version))) - 100
+
+    return {
+        "/home: товары поддерева категории": filter_items(select(Item), None, leaf_path)
+        .order_by(Item.id.desc()),
+        "/api/v1/items: страница по категории": filter_items(select(Item.id, Item.name), None, zone_path)
+        .where(Item.id > 1000).order_by(Item.id).limit(100),
+        "/logs: первая страница": logs_query(select(Log)),
+        "/logs: следующая страница": logs_query(select(Log), before_id=before_id),
+        "/logs: по пользователю": logs_query(select(Log), user_id=user_id),
+        "/logs: по товару": logs_query(select(Log), item_id=item_id),
+        "/inventory/{id}: строки инвентаризации": select(
+            InventoryItem.id, InventoryItem.item_id, InventoryItem.expected_qty, InventoryItem.actual_qty,
+            InventoryItem.difference
+        ).where(InventoryItem.inventory_id == inventory_id).order_by(InventoryItem.id),
+        "/inventory/: страница списка": inventories_query(select(Inventory)),
+        "/inventory/: следующая страница": inventories_query(select(Inventory), before_inventory_id),
+        "/inventory/: количество строк": select(InventoryItem.inventory_id, func.count())
+        .where(InventoryItem.inventory_id.in_([inventory_id, inventory_id - 1]))
+        .group_by(InventoryItem.inventory_id),
+        "/sync/changes: товары после курсора": changes_query("items", (sync_txid, sync_version), sync_txid + 1, 501),
+        "/sync/changes: строки инвентаризаций": changes_query(
+            "inventory_lines", (sync_txid, 0), sync_txid + 1, 501
+        ),
+        "категории: поддерево по пути": subtree_ids(zone_path),
+    }
+
+
+def seq_scans(plan) -> list[str]:
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") not in SMALL_TABLES:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+async def main():
+    failed = False
+    async with engine.connect() as conn:
+        diff = await conn.run_sync(lambda sync_conn: compare_metadata(MigrationContext.configure(sync_conn),
+                                                                      Base.metadata))
+        if diff:
+            print("Схема БД расходится с models.py — нужна миграция:")
+            for entry in diff:
+                print(f"  {entry}")
+            failed = True
+        else:
+            print("Схема БД совпадает с models.py")
+
+        if await sample(conn, select(func.count()).select_from(Item)):
+            print("В базе уже есть товары — запустите проверку на пустой тестовой базе")
+            sys.exit(1)
+        await conn.rollback()
+
+        transaction = await conn.begin()
+        try:
+            for statement in SEED:
+                await conn.execute(text(statement))
+
+            for name, query in (await hot_queries(conn)).items():
+                result = await conn.execute(text(f"EXPLAIN (FORMAT JSON) {compile_query(query)}"))
+                plan = result.scalar()
+                plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+                scans = seq_scans(plan)
+                status = f"Seq Scan: {', '.join(scans)}" if scans else "ok"
+                print(f"{name:45} cost={plan['Total Cost']:>10.1f}  {status}")
+                failed = failed or bool(scans)
+        finally:
+            await transaction.rollback()
+
+    await engine.dispose()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
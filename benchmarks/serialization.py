@@ -0,0 +1,61 @@
+# Стоимость сериализации 10 000 товаров разными способами.
+# Запуск: python -m benchmarks.serialization
+import json
+import random
+import time
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+import orjson
+from schemas import ItemOut
+
+ROWS = 10_000
+REPEATS = 20
+
+
+def make_rows():
+    rnd = random.Random(42)
+    return [
+        {
+            "id": i,
+            "name": f"Товар {i}",
+            "description": "Описание товара " * 3,
+            "quantity": rnd.randint(0, 500),
+            "price": round(rnd.uniform(1, 10_000), 2),
+            "category_id": rnd.randint(1, 50),
+            "version": i,
+        }
+        for i in range(1, ROWS + 1)
+    ]
+
+
+def measure(func):
+    func()  # прогрев
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        func()
+    return (time.perf_counter() - start) / REPEATS * 1000
+
+
+def main():
+    rows = make_rows()
+    adapter = TypeAdapter(list[ItemOut])
+
+    cases = {
+        # Путь FastAPI по умолчанию: валидация response_model, jsonable_encoder, json.dumps
+        "pydantic + jsonable_encoder + json": lambda: json.dumps(
+            jsonable_encoder(adapter.validate_python(rows))
+        ).encode(),
+        "pydantic (dump_json)": lambda: adapter.dump_json(adapter.validate_python(rows)),
+        "json.dumps словарей": lambda: json.dumps(rows).encode(),
+        # Путь /api/v1: словари из строк запроса сразу в orjson
+        "orjson словарей": lambda: orjson.dumps(rows),
+    }
+
+    size = len(orjson.dumps(rows))
+    print(f"{ROWS} товаров, {size / 1024:.0f} КБ JSON, среднее из {REPEATS} запусков")
+    for name, func in cases.items():
+        print(f"{name:40s} {measure(func):8.2f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Время холодного импорта приложения и проверка, что тяжёлые зависимости не грузятся при старте.
+# Запуск: python -m benchmarks.startup   (код выхода 1 — регрессия)
+# Порог задаётся переменной STARTUP_BUDGET_MS.
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RUNS = 5
+BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", 1500))
+
+# Эти модули нужны только отдельным маршрутам и должны подгружаться лениво
+LAZY_MODULES = ["pandas", "numpy", "openpyxl", "qrcode", "PIL", "passlib"]
+
+PROBE = (
+    "import sys, time; start = time.perf_counter(); import main; "
+    "elapsed = (time.perf_counter() - start) * 1000; "
+    f"loaded = [m for m in {LAZY_MODULES!r} if m in sys.modules]; "
+    "print(f\"{elapsed}|{','.join(loaded)}\")"
+)
+
+
+def measure_once():
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, check=True)
+    wall = (time.perf_counter() - start) * 1000
+    import_ms, loaded = result.stdout.strip().splitlines()[-1].split("|")
+    return float(import_ms), wall, [name for name in loaded.split(",") if name]
+
+
+def main():
+    imports, walls, loaded = [], [], set()
+    for _ in range(RUNS):
+        import_ms, wall, modules = measure_once()
+        imports.append(import_ms)
+        walls.append(wall)
+        loaded.update(modules)
+
+    import_median = statistics.median(imports)
+    print(f"import main: медиана {import_median:.0f} мс, процесс целиком {statistics.median(walls):.0f} мс "
+          f"({RUNS} запусков, порог {BUDGET_MS:.0f} мс)")
+
+    failed = False
+    if loaded:
+        print(f"Тяжёлые модули загружены при старте: {', '.join(sorted(loaded))}")
+        failed = True
+    if import_median > BUDGET_MS:
+        print("Импорт приложения медленнее порога")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
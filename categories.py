@@ -1,39 +1,140 @@
+from typing import Optional
+from aiocache import Cache
 from fastapi import APIRouter, Request, Depends, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
+from sqlalchemy import update, func, literal
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from database.db_depends import get_db
-from models import Category
-from fastapi.templating import Jinja2Templates
+from models import Category, Item, SyncTombstone
+from utils.templating import templates
+from utils.stock import record_category_move, record_category_removal
 
-templates = Jinja2Templates(directory="templates")
 
 router = APIRouter(prefix="/categories", tags=["Categories"])
 
+# Дерево категорий меняется редко — держим его в памяти и сбрасываем при любом изменении
+tree_cache = Cache(Cache.MEMORY)
+TREE_KEY = "category_tree"
+
+
+# Плоский список категорий в порядке обхода дерева (по path), с глубиной для отступов.
+# Сравнение побайтовое (COLLATE "C"): в языковых сортировках '/' не учитывается, и '/1/2/'
+# попадал бы после '/10/'; в "C" '/' меньше цифр, и потомки идут сразу за родителем
+async def get_category_tree(db: AsyncSession):
+    tree = await tree_cache.get(TREE_KEY)
+    if tree is None:
+        result = await db.execute(
+            select(Category.id, Category.name, Category.parent_id, Category.path, Category.depth)
+            .order_by(Category.path.collate("C"))
+        )
+        tree = [dict(row._mapping) for row in result.all()]
+        await tree_cache.set(TREE_KEY, tree)
+    return tree
+
+
+async def invalidate_category_tree():
+    await tree_cache.delete(TREE_KEY)
+
+
+# Путь категории из кэшированного дерева (None, если категории нет — вызывающий код,
+# получивший id, должен отличать это от «без фильтра»)
+async def get_category_path(db: AsyncSession, category_id: Optional[int]) -> Optional[str]:
+    if not category_id:
+        return None
+    for cat in await get_category_tree(db):
+        if cat["id"] == category_id:
+            return cat["path"]
+    return None
+
+
+# Подзапрос id всех категорий поддерева. Путь передаётся константой,
+# чтобы LIKE 'prefix%' шёл по индексу ix_categories_path
+def subtree_ids(path: str):
+    return select(Category.id).where(Category.path.startswith(path))
+
+
+# Количество и стоимость товаров в поддереве одним запросом
+async def get_subtree_totals(db: AsyncSession, path: str):
+    result = await db.execute(
+        select(func.coalesce(func.sum(Item.quantity), 0), func.coalesce(func.sum(Item.quantity * Item.price), 0))
+        .where(Item.category_id.in_(subtree_ids(path)))
+    )
+    quantity, value = result.one()
+    return {"quantity": quantity, "value": value}
+
+
+def _parse_id(value: Optional[str]) -> Optional[int]:
+    return int(value) if value and value.isdigit() else None
+
+
+# Условие «дочерние категории parent_id» (None — корневые)
+def _children_of(parent_id: Optional[int]):
+    return Category.parent_id == parent_id if parent_id else Category.parent_id.is_(None)
+
+
+# Имена из names, которые уже заняты у родителя parent_id (кроме категории except_id).
+# Проверяем заранее, чтобы вместо ошибки uq_categories_parent_name ответить понятным 400
+async def _taken_names(db: AsyncSession, parent_id: Optional[int], names, except_id: Optional[int] = None):
+    query = select(Category.name).where(_children_of(parent_id), Category.name.in_(names))
+    if except_id:
+        query = query.where(Category.id != except_id)
+    return list((await db.execute(query)).scalars())
+
 
 # 📌 Список категорий
 @router.get("/list", response_class=HTMLResponse)
 async def list_categories(request: Request, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Category))
-    categories = result.scalars().all()
+    tree = await get_category_tree(db)
+
+    # Итоги по каждой категории считаем одним GROUP BY, а суммы поддеревьев — по префиксам путей
+    result = await db.execute(
+        select(Item.category_id, func.sum(Item.quantity), func.sum(Item.quantity * Item.price))
+        .where(Item.category_id.isnot(None))
+        .group_by(Item.category_id)
+    )
+    own = {category_id: (quantity or 0, value or 0) for category_id, quantity, value in result.all()}
+
+    totals = {cat["id"]: {"quantity": 0, "value": 0} for cat in tree}
+    for cat in tree:
+        quantity, value = own.get(cat["id"], (0, 0))
+        for ancestor_id in cat["path"].strip("/").split("/"):
+            if ancestor_id and int(ancestor_id) in totals:
+                totals[int(ancestor_id)]["quantity"] += quantity
+                totals[int(ancestor_id)]["value"] += value
+
+    categories = [{**cat, **totals[cat["id"]]} for cat in tree]
     return templates.TemplateResponse("categories_list.html", {"request": request, "categories": categories})
 
 
 # 📌 Страница создания
 @router.get("/create", response_class=HTMLResponse)
-async def create_category_form(request: Request):
-    return templates.TemplateResponse("create_category.html", {"request": request})
+async def create_category_form(request: Request, db: AsyncSession = Depends(get_db)):
+    categories = await get_category_tree(db)
+    return templates.TemplateResponse("create_category.html", {"request": request, "categories": categories})
 
 
 # 📌 POST: создание
 @router.post("/create")
 async def create_category(
     name: str = Form(...),
+    parent_id: Optional[str] = Form(None),
     db: AsyncSession = Depends(get_db)
 ):
-    new_category = Category(name=name)
+    parent = await db.get(Category, _parse_id(parent_id)) if _parse_id(parent_id) else None
+    if _parse_id(parent_id) and not parent:
+        return HTMLResponse(content="Родительская категория не найдена", status_code=404)
+    if await _taken_names(db, parent.id if parent else None, [name]):
+        return HTMLResponse(content=f"Категория «{name}» здесь уже есть", status_code=400)
+
+    new_category = Category(name=name, parent_id=parent.id if parent else None)
     db.add(new_category)
+    await db.flush()  # нужен id для пути
+
+    new_category.path = f"{parent.path if parent else '/'}{new_category.id}/"
+    new_category.depth = parent.depth + 1 if parent else 0
     await db.commit()
+    await invalidate_category_tree()
     return RedirectResponse(url="/categories/list", status_code=303)
 
 
@@ -44,7 +145,27 @@ async def edit_category_form(category_id: int, request: Request, db: AsyncSessio
     category = result.scalar_one_or_none()
     if not category:
         return HTMLResponse(content="Категория не найдена", status_code=404)
-    return templates.TemplateResponse("edit_category.html", {"request": request, "category": category})
+
+    # Нельзя перенести категорию внутрь её же поддерева
+    categories = [cat for cat in await get_category_tree(db) if not cat["path"].startswith(category.path)]
+    return templates.TemplateResponse(
+        "edit_category.html",
+        {"request": request, "category": category, "categories": categories}
+    )
+
+
+# Перенос поддерева: один UPDATE заменяет префикс пути у всех потомков
+async def move_subtree(db: AsyncSession, old_path: str, new_path: str, depth_delta: int):
+    await record_category_move(db, old_path, new_path)
+    await db.execute(
+        update(Category)
+        .where(Category.path.startswith(old_path))
+        .values(
+            path=literal(new_path) + func.substr(Category.path, len(old_path) + 1),
+            depth=Category.depth + depth_delta
+        )
+        .execution_options(synchronize_session=False)
+    )
 
 
 # 📌 POST: обновление
@@ -52,6 +173,7 @@ async def edit_category_form(category_id: int, request: Request, db: AsyncSessio
 async def update_category(
     category_id: int,
     name: str = Form(...),
+    parent_id: Optional[str] = Form(None),
     db: AsyncSession = Depends(get_db)
 ):
     result = await db.execute(select(Category).where(Category.id == category_id))
@@ -59,8 +181,24 @@ async def update_category(
     if not category:
         return HTMLResponse(content="Категория не найдена", status_code=404)
 
+    new_parent_id = _parse_id(parent_id)
+    if await _taken_names(db, new_parent_id, [name], except_id=category.id):
+        return HTMLResponse(content=f"Категория «{name}» здесь уже есть", status_code=400)
+    if new_parent_id != category.parent_id:
+        parent = await db.get(Category, new_parent_id) if new_parent_id else None
+        if new_parent_id and not parent:
+            return HTMLResponse(content="Родительская категория не найдена", status_code=404)
+        if parent and parent.path.startswith(category.path):
+            return HTMLResponse(content="Нельзя перенести категорию внутрь самой себя", status_code=400)
+
+        new_path = f"{parent.path if parent else '/'}{category.id}/"
+        new_depth = parent.depth + 1 if parent else 0
+        await move_subtree(db, category.path, new_path, new_depth - category.depth)
+        category.parent_id = new_parent_id
+
     category.name = name
     await db.commit()
+    await invalidate_category_tree()
     return RedirectResponse(url="/categories/list", status_code=303)
 
 
@@ -72,6 +210,37 @@ async def delete_category(category_id: int, db: AsyncSession = Depends(get_db)):
     if not category:
         return HTMLResponse(content="Категория не найдена", status_code=404)
 
+    # Дочерние категории поднимаем на уровень удаляемой — их имена не должны совпасть с соседними
+    child_names = (await db.execute(select(Category.name).where(Category.parent_id == category.id))).scalars().all()
+    taken = await _taken_names(db, category.parent_id, child_names, except_id=category.id)
+    if taken:
+        return HTMLResponse(
+            content=f"Нельзя удалить: вложенные категории совпадут по имени с соседними ({', '.join(taken)})",
+            status_code=400
+        )
+
+    # Дочерние категории поднимаем на уровень удаляемой
+    parent_path = category.path[:-len(f"{category.id}/")]
+    await record_category_move(db, category.path, parent_path, exclude_id=category.id)
+    await record_category_removal(db, category.id)
+    await db.execute(
+        update(Category)
+        .where(Category.parent_id == category.id)
+        .values(parent_id=category.parent_id)
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        update(Category)
+        .where(Category.path.startswith(category.path), Category.id != category.id)
+        .values(
+            path=literal(parent_path) + func.substr(Category.path, len(category.path) + 1),
+            depth=Category.depth - 1
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    db.add(SyncTombstone(entity="category", entity_id=category.id))
     await db.delete(category)
     await db.commit()
+    await invalidate_category_tree()
     return RedirectResponse(url="/categories/list", status_code=303)
@@ -0,0 +1,43 @@
+import re
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, Request, Query, HTTPException
+from fastapi.responses import HTMLResponse, ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.db_depends import get_db
+from utils.templating import templates
+from categories import get_category_tree
+from utils.stock import BUCKETS, load_series, hour_floor, day_floor
+
+router = APIRouter(prefix="/charts", tags=["Charts"])
+
+SERIES_PATTERN = re.compile(r"^(total|category:\d+|item:\d+)$")
+# Сколько дней можно запросить за раз: часов хранится 90 дней, и больше месяца почасово не нарисовать
+MAX_DAYS = {"hour": 31, "day": 1825}
+
+
+@router.get("/", response_class=HTMLResponse)
+async def charts_page(request: Request, db: AsyncSession = Depends(get_db)):
+    categories = await get_category_tree(db)
+    return templates.TemplateResponse("charts.html", {"request": request, "categories": categories})
+
+
+# Остаток и стоимость по ряду: ?series=total|category:<id>|item:<id>&bucket=hour|day&days=N
+@router.get("/series")
+async def stock_series(
+    series: str = Query("total"),
+    bucket: str = Query("day"),
+    days: int = Query(90, ge=1),
+    db: AsyncSession = Depends(get_db)
+):
+    if not SERIES_PATTERN.match(series):
+        raise HTTPException(status_code=400, detail="series: total, category:<id> или item:<id>")
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail="bucket: hour или day")
+    if days > MAX_DAYS[bucket]:
+        raise HTTPException(status_code=400, detail=f"Для bucket={bucket} не больше {MAX_DAYS[bucket]} дней")
+
+    # Последний интервал — текущий, в нём действует последний сведённый остаток
+    floor = hour_floor if bucket == "hour" else day_floor
+    end = floor(datetime.utcnow()) + BUCKETS[bucket]
+    start = end - timedelta(days=days)
+    return ORJSONResponse(await load_series(db, series, bucket, start, end))
@@ -2,8 +2,11 @@ from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, Asyn
 from sqlalchemy.orm import DeclarativeBase
 
 from dotenv import load_dotenv
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 # Определяем окружение
 environment = os.getenv("ENVIRONMENT", "local")
 
@@ -20,10 +23,15 @@ DATABASE_URL = (
     f"{os.getenv('POSTGRES_DB')}"
 )
 
-print(f"Подключение к БД: {os.getenv('POSTGRES_HOST')}:{os.getenv('POSTGRES_PORT')}")
-print(f"Окружение: {environment}")
+logger.info("Подключение к БД: %s:%s, окружение: %s", os.getenv('POSTGRES_HOST'), os.getenv('POSTGRES_PORT'), environment)
 
-engine = create_async_engine(DATABASE_URL)
+# Движок не подключается при импорте: соединения открываются при первом запросе
+# или заранее, при прогреве пула в main.lifespan
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=int(os.getenv("DB_POOL_SIZE", 5)),
+    pool_pre_ping=True
+)
 new_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
 class Base(DeclarativeBase):
@@ -1,31 +1,37 @@
 from fastapi import APIRouter, Request, Depends, Query
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+from utils.templating import templates
 from sqlalchemy import select, func, desc
 from sqlalchemy.ext.asyncio import AsyncSession
 from database.db_depends import get_db
-from models import Item, Category, User
+from models import Item, User
 from typing import Optional
 from auth import get_current_user
 from aiocache import cached, Cache
+from categories import get_category_tree, get_category_path, subtree_ids
 
 
 
 router = APIRouter(prefix='/home',
                    tags=['Home'],)
 router.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
 
 
-# Асинхронная функция для получения товаров с кэшированием
-@cached(ttl=60, cache=Cache.MEMORY)  # Кэш 60 секунд
-async def get_items(db: AsyncSession, search: Optional[str] = None, category_id: Optional[int] = None):
-    query = select(Item).order_by(desc(Item.id))
+# Фильтры списка товаров — общие для страницы /home и JSON API
+def filter_items(query, search: Optional[str] = None, category_path: Optional[str] = None):
     if search:
         query = query.where(Item.name.ilike(f"%{search}%"))
-    if category_id:
-        query = query.where(Item.category_id == category_id)
+    if category_path:
+        # Товары выбранной категории и всех вложенных (зона → стеллажи → категории)
+        query = query.where(Item.category_id.in_(subtree_ids(category_path)))
+    return query
+
+
+# Асинхронная функция для получения товаров с кэшированием
+@cached(ttl=60, cache=Cache.MEMORY)  # Кэш 60 секунд
+async def get_items(db: AsyncSession, search: Optional[str] = None, category_path: Optional[str] = None):
+    query = filter_items(select(Item), search, category_path).order_by(desc(Item.id))
     result = await db.execute(query)
     return result.scalars().all()
 
@@ -38,16 +44,16 @@ async def home(
     search: Optional[str] = Query(None),
     category_id: Optional[str] = Query(None)
 ):
-    # Получаем категории (не кэшируем — они редко грузятся и мало)
-    cat_result = await db.execute(select(Category))
-    categories = cat_result.scalars().all()
+    # Дерево категорий берём из кэша
+    categories = await get_category_tree(db)
+    selected_category = int(category_id) if category_id and category_id.isdigit() else None
+    category_path = await get_category_path(db, selected_category)
 
-    # Получаем товары через кэшированную функцию
-    items = await get_items(
-        db,
-        search=search,
-        category_id=int(category_id) if category_id and category_id.isdigit() else None
-    )
+    # Получаем товары через кэшированную функцию; у несуществующей категории товаров нет
+    if selected_category and category_path is None:
+        items = []
+    else:
+        items = await get_items(db, search=search, category_path=category_path)
 
     # Считаем общую стоимость
     total_cost_result = await db.execute(select(func.sum(Item.price * Item.quantity)))
@@ -57,7 +63,7 @@ async def home(
         "request": request,
         "items": items,
         "categories": categories,
-        "selected_category": int(category_id) if category_id and category_id.isdigit() else None,
+        "selected_category": selected_category,
         "search": search,
         "current_user": current_user,
         "total_cost": total_cost
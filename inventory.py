@@ -1,145 +1,151 @@
-import pandas as pd
-from io import BytesIO
 from fastapi import APIRouter, Depends, Request, Form, Query
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import insert, update, func, case, literal, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from fastapi.responses import StreamingResponse
 from database.db_depends import get_db
-from models import Item, Inventory, InventoryItem, User
-from fastapi.templating import Jinja2Templates
+from models import (Item, Category, Inventory, InventoryItem, InventoryAdjustment, Log, ActionType, User,
+                    ReportSnapshot, StockPoint)
+from utils.templating import templates
 from auth import get_current_user
+from categories import get_category_path, subtree_ids
+from utils.admission import report_limit, inventory_start_limit
+from utils.reports import REPORT_JOB, build_report_snapshot, latest_snapshot, latest_snapshot_file
+from utils.scheduler import get_job_state, request_job
 
 router = APIRouter(prefix="/inventory", tags=["Inventory"])
-templates = Jinja2Templates(directory="templates")
 
 from sqlalchemy.orm import selectinload
 
+INVENTORY_PAGE_SIZE = 50
+
+
+# Страница списка от новых к старым по ключу (created_at, id) — индекс ix_inventories_created_at_id;
+# before_id — последняя инвентаризация предыдущей страницы
+def inventories_query(query, before_id: Optional[int] = None):
+    if before_id:
+        before = select(Inventory.created_at).where(Inventory.id == before_id).scalar_subquery()
+        query = query.where(tuple_(Inventory.created_at, Inventory.id) < tuple_(before, before_id))
+    return query.order_by(Inventory.created_at.desc(), Inventory.id.desc()).limit(INVENTORY_PAGE_SIZE)
+
+
 @router.get("/", response_class=HTMLResponse)
-async def list_inventories(request: Request, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(Inventory)
-        .options(
-            selectinload(Inventory.items),           # загружаем товары
-            selectinload(Inventory.created_by_user)  # загружаем пользователя
-        )
-        .order_by(Inventory.created_at.desc())
-    )
+async def list_inventories(
+    request: Request,
+    before_id: Optional[int] = Query(None, ge=1),
+    db: AsyncSession = Depends(get_db)
+):
+    query = select(Inventory).options(selectinload(Inventory.created_by_user))  # загружаем пользователя
+    result = await db.execute(inventories_query(query, before_id))
     inventories = result.scalars().all()
 
+    # Количество строк считаем в БД по индексу, а не загружаем все строки инвентаризаций
+    counts = {}
+    if inventories:
+        count_result = await db.execute(
+            select(InventoryItem.inventory_id, func.count())
+            .where(InventoryItem.inventory_id.in_([inv.id for inv in inventories]))
+            .group_by(InventoryItem.inventory_id)
+        )
+        counts = dict(count_result.all())
+
     return templates.TemplateResponse(
         "inventory_list.html",
         {
             "request": request,
-            "inventories": inventories
+            "inventories": inventories,
+            "counts": counts,
+            "has_more": len(inventories) == INVENTORY_PAGE_SIZE
         }
     )
 
 
-# Создать инвентаризацию
-@router.post("/start")
+# Создать инвентаризацию (по всему складу или по поддереву категорий)
+@router.post("/start", dependencies=[Depends(inventory_start_limit)])
 async def start_inventory(
+    category_id: Optional[str] = Form(None),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    items = (await db.execute(select(Item))).scalars().all()
+    selected_category = int(category_id) if category_id and category_id.isdigit() else None
+    category_path = await get_category_path(db, selected_category)
+    if selected_category and category_path is None:
+        return HTMLResponse("Категория не найдена", status_code=404)
 
     inv = Inventory(created_by=current_user.id)
     db.add(inv)
-    await db.commit()
-    await db.refresh(inv)
+    await db.flush()
 
-    for item in items:
-        inv_item = InventoryItem(
-            inventory_id=inv.id,
-            item_id=item.id,
-            expected_qty=item.quantity
-        )
-        db.add(inv_item)
+    # Снимок остатков одним INSERT ... SELECT
+    snapshot = select(literal(inv.id), Item.id, Item.quantity)
+    if category_path:
+        snapshot = snapshot.where(Item.category_id.in_(subtree_ids(category_path)))
+
+    await db.execute(
+        insert(InventoryItem).from_select(["inventory_id", "item_id", "expected_qty"], snapshot)
+    )
 
     await db.commit()
     return RedirectResponse(f"/inventory/{inv.id}", status_code=303)
 
+# Отчёт отдаётся из последнего снимка; снимки собирает планировщик (utils/reports.py)
 @router.get("/report")
 async def inventory_report(request: Request, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Item).options(selectinload(Item.category)))
-    items = result.scalars().all()
-
-    report_items = []
-    total_quantity = 0
-    total_value = 0
-    for item in items:
-        qty = item.quantity or 0
-        price = item.price or 0
-        total = qty * price
-        total_quantity += qty
-        total_value += total
-        report_items.append({
-            "name": item.name,
-            "category": item.category.name if item.category else "-",
-            "quantity": qty,
-            "price": price,
-            "total_value": total
-        })
+    snapshot = await latest_snapshot(db)
+    if snapshot is None:
+        # Снимков ещё нет (первый запуск) — собираем сразу
+        await build_report_snapshot(db)
+        await db.commit()
+        snapshot = await latest_snapshot(db)
+    job = await get_job_state(db, REPORT_JOB)
 
     return templates.TemplateResponse(
         "inventory_report.html",
         {
             "request": request,
-            "items": report_items,
-            "total_quantity": total_quantity,
-            "total_value": total_value
+            "items": snapshot.data["items"],
+            "total_quantity": snapshot.data["total_quantity"],
+            "total_value": snapshot.data["total_value"],
+            "generated_at": snapshot.created_at,
+            "refresh_requested": bool(job and job.requested_at),
+            "refresh_error": job.last_error if job else None
         }
     )
 
+
+# Внеочередная сборка отчёта: ставим задачу и сразу возвращаемся на страницу
+@router.post("/report/refresh", dependencies=[Depends(report_limit)])
+async def refresh_inventory_report(db: AsyncSession = Depends(get_db)):
+    await request_job(db, REPORT_JOB)
+    return RedirectResponse("/inventory/report", status_code=303)
+
+
+async def snapshot_download(db: AsyncSession, column, media_type: str, extension: str):
+    snapshot = await latest_snapshot_file(db, column)
+    if snapshot is None:
+        return HTMLResponse(content="Отчёт ещё не сформирован", status_code=404)
+    created_at, content = snapshot
+    filename = f"inventory_report_{created_at:%Y%m%d_%H%M}.{extension}"
+    return Response(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
 @router.get("/report/download")
 async def download_inventory_report(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Item).options(selectinload(Item.category)))
-    items = result.scalars().all()
-
-    report_items = []
-    total_quantity = 0
-    total_value = 0
-    for item in items:
-        qty = item.quantity or 0
-        price = item.price or 0
-        total = qty * price
-        total_quantity += qty
-        total_value += total
-        report_items.append({
-            "Название": item.name,
-            "Категория": item.category.name if item.category else "-",
-            "Количество": qty,
-            "Цена": price,
-            "Сумма": total
-        })
-
-    # Добавляем итоговую строку
-    report_items.append({
-        "Название": "Итого",
-        "Категория": "",
-        "Количество": total_quantity,
-        "Цена": "",
-        "Сумма": total_value
-    })
-
-    def create_excel(data):
-        df = pd.DataFrame(data)
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name="Отчет")
-        output.seek(0)
-        return output
-
-    import asyncio
-    output = await asyncio.to_thread(create_excel, report_items)
-
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=inventory_report.xlsx"}
+    return await snapshot_download(
+        db, ReportSnapshot.xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"
     )
 
+
+@router.get("/report/download/csv")
+async def download_inventory_report_csv(db: AsyncSession = Depends(get_db)):
+    return await snapshot_download(db, ReportSnapshot.csv, "text/csv; charset=utf-8", "csv")
+
 @router.get("/{inv_id}")
 async def view_inventory(inv_id: int, request: Request, db: AsyncSession = Depends(get_db)):
     inv = await db.get(Inventory, inv_id)
@@ -154,15 +160,136 @@ async def view_inventory(inv_id: int, request: Request, db: AsyncSession = Depen
         )
     ).scalars().all()
 
+    # Для проведённой инвентаризации показываем итоги по категориям
+    shrinkage = await get_shrinkage_summary(db, inv_id) if inv.finalized_at else []
+
     return templates.TemplateResponse(
         "inventory.html",
         {
             "request": request,
             "inventory": inv,
-            "items": items
+            "items": items,
+            "shrinkage": shrinkage
+        }
+    )
+
+
+# Итоги проведённой инвентаризации по категориям: недостача (шт. и ₽) и общее отклонение в ₽
+async def get_shrinkage_summary(db: AsyncSession, inv_id: int):
+    shortage = case((InventoryAdjustment.difference < 0, -InventoryAdjustment.difference), else_=0)
+    shortage_value = func.sum(shortage * InventoryAdjustment.price)
+
+    result = await db.execute(
+        select(
+            Category.name,
+            func.count(InventoryAdjustment.id),
+            func.sum(shortage),
+            shortage_value,
+            func.sum(InventoryAdjustment.difference * InventoryAdjustment.price)
+        )
+        .select_from(InventoryAdjustment)
+        .outerjoin(Category, Category.id == InventoryAdjustment.category_id)
+        .where(InventoryAdjustment.inventory_id == inv_id)
+        .group_by(Category.name)
+        .order_by(shortage_value.desc())
+    )
+
+    return [
+        {
+            "category": name or "-",
+            "lines": lines,
+            "shortage_qty": shortage_qty or 0,
+            "shortage_value": shortage_sum or 0,
+            "net_value": net_value or 0
         }
+        for name, lines, shortage_qty, shortage_sum, net_value in result.all()
+    ]
+
+
+# Провести инвентаризацию: перенести фактические остатки в товары и закрыть её
+@router.post("/{inv_id}/finalize")
+async def finalize_inventory(
+    inv_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Блокируем инвентаризацию до конца транзакции — повторное проведение и ввод факта будут ждать
+    inv = (
+        await db.execute(select(Inventory).where(Inventory.id == inv_id).with_for_update())
+    ).scalar_one_or_none()
+    if not inv:
+        return HTMLResponse("Инвентаризация не найдена", status_code=404)
+    if inv.finalized_at is not None:
+        return RedirectResponse(f"/inventory/{inv_id}", status_code=303)
+
+    counted = (InventoryItem.inventory_id == inv_id) & InventoryItem.actual_qty.isnot(None)
+    # Остаток мог измениться после старта (приход, отгрузка) — применяем к текущему остатку
+    # только расхождение пересчёта с ожидаемым, а не затираем его фактом на момент пересчёта
+    difference = InventoryItem.actual_qty - InventoryItem.expected_qty
+
+    # Строки корректировок пишем одним INSERT ... SELECT, пока в товарах ещё старые остатки
+    adjustments = await db.execute(
+        insert(InventoryAdjustment).from_select(
+            ["inventory_id", "item_id", "category_id", "old_qty", "new_qty", "difference", "price"],
+            select(
+                InventoryItem.inventory_id,
+                Item.id,
+                Item.category_id,
+                Item.quantity,
+                Item.quantity + difference,
+                difference,
+                Item.price
+            )
+            .join(Item, Item.id == InventoryItem.item_id)
+            .where(counted)
+        )
     )
 
+    # История остатков для графиков — из тех же корректировок
+    await db.execute(
+        insert(StockPoint).from_select(
+            ["recorded_at", "item_id", "category_path", "qty_delta", "value_delta"],
+            select(
+                literal(datetime.utcnow()),
+                InventoryAdjustment.item_id,
+                Category.path,
+                InventoryAdjustment.difference,
+                InventoryAdjustment.difference * InventoryAdjustment.price
+            )
+            .outerjoin(Category, Category.id == InventoryAdjustment.category_id)
+            .where(InventoryAdjustment.inventory_id == inv_id, InventoryAdjustment.difference != 0)
+        )
+    )
+
+    # Остатки обновляем одним UPDATE items ... FROM inventory_items
+    await db.execute(
+        update(Item)
+        .where(Item.id == InventoryItem.item_id, counted)
+        .values(quantity=Item.quantity + difference)
+        .execution_options(synchronize_session=False)
+    )
+
+    inv.finalized_at = datetime.utcnow()
+    inv.finalized_by = current_user.id
+
+    shrinkage = await get_shrinkage_summary(db, inv_id)
+    shortage_qty = sum(row["shortage_qty"] for row in shrinkage)
+    shortage_value = sum(row["shortage_value"] for row in shrinkage)
+
+    # Одна итоговая запись в журнал вместо записи на каждую позицию
+    db.add(Log(
+        user_id=current_user.id,
+        action=ActionType.UPDATE,
+        description=(
+            f"Пользователь {current_user.name} провёл инвентаризацию №{inv_id}: "
+            f"скорректировано позиций {adjustments.rowcount}, "
+            f"недостача {shortage_qty} шт. на сумму {shortage_value} ₽"
+        )
+    ))
+
+    await db.commit()
+    return RedirectResponse(f"/inventory/{inv_id}", status_code=303)
+
 
 
 # Ввести фактическое количество
@@ -176,6 +303,15 @@ async def update_inventory_item(
     if not inv_item:
         return HTMLResponse("Запись не найдена", status_code=404)
 
+    # FOR SHARE: если инвентаризацию сейчас проводят, дождёмся окончания и увидим её закрытой
+    inv = (
+        await db.execute(
+            select(Inventory).where(Inventory.id == inv_item.inventory_id).with_for_update(read=True)
+        )
+    ).scalar_one()
+    if inv.finalized_at is not None:
+        return HTMLResponse("Инвентаризация уже проведена", status_code=409)
+
     inv_item.actual_qty = actual_qty
     inv_item.difference = actual_qty - inv_item.expected_qty
 
@@ -1,20 +1,22 @@
+import asyncio
 import json
-import qrcode
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi import APIRouter, Depends, Request, Form, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 from database.db_depends import get_db
-from models import Item, Category, Log, ActionType, User
-from fastapi.templating import Jinja2Templates
+from models import Item, Log, ActionType, User, SyncTombstone
+from utils.templating import templates
 from typing import Optional
 from utils.logs import log_action
 from auth import get_current_user
+from categories import get_category_tree, get_category_path
+from utils.stock import stock_change_points, record_stock_points
+from utils.admission import qr_limit
 from fastapi.responses import StreamingResponse
 from io import BytesIO
 
-templates = Jinja2Templates(directory="templates")
 
 router = APIRouter(prefix='/items', tags=['Items'])
 
@@ -22,8 +24,7 @@ router = APIRouter(prefix='/items', tags=['Items'])
 # форма создания товара
 @router.get("/create", response_class=HTMLResponse)
 async def create_item_form(request: Request, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Category))
-    categories = result.scalars().all()
+    categories = await get_category_tree(db)
     return templates.TemplateResponse("create_item.html", {"request": request, "categories": categories})
 
 
@@ -48,6 +49,10 @@ async def create_item(
         category_id=cat_id
     )
     db.add(new_item)
+    await db.flush()  # нужен id для истории остатков
+    await record_stock_points(
+        db, stock_change_points(new_item.id, None, (quantity, price, await get_category_path(db, cat_id)))
+    )
     await db.commit()
     await db.refresh(new_item)
 
@@ -73,8 +78,7 @@ async def edit_item_form(item_id: int, request: Request, db: AsyncSession = Depe
     item = result.scalar_one_or_none()
     if not item:
         return HTMLResponse(content="Товар не найден", status_code=404)
-    cat_result = await db.execute(select(Category))
-    categories = cat_result.scalars().all()
+    categories = await get_category_tree(db)
 
     return templates.TemplateResponse("edit_item.html", {"request": request, "item": item, "categories": categories})
 
@@ -96,6 +100,7 @@ async def update_item(
     if not item:
         return HTMLResponse(content="Товар не найден", status_code=404)
 
+    old_stock = (item.quantity, item.price, await get_category_path(db, item.category_id))
     old_values = f"""
     Название - {item.name}
     Описание - {item.description}
@@ -111,6 +116,9 @@ async def update_item(
     item.price = price
     item.category_id = int(category_id) if category_id and category_id.isdigit() else None
 
+    await record_stock_points(db, stock_change_points(
+        item.id, old_stock, (quantity, price, await get_category_path(db, item.category_id))
+    ))
     await db.commit()
     await db.refresh(item)
 
@@ -150,12 +158,16 @@ async def delete_item(item_id: int, db: AsyncSession = Depends(get_db), current_
         description=f"Пользователь {current_user.name} удалил товар: {item.name}"
     )
     db.add(log)
+    db.add(SyncTombstone(entity="item", entity_id=item.id))
+    await record_stock_points(db, stock_change_points(
+        item.id, (item.quantity, item.price, await get_category_path(db, item.category_id)), None
+    ))
 
     await db.delete(item)
     await db.commit()
     return RedirectResponse(url="/home", status_code=303)
 
-@router.get("/{item_id}/qr")
+@router.get("/{item_id}/qr", dependencies=[Depends(qr_limit)])
 async def generate_qr(item_id: int, session: AsyncSession = Depends(get_db)):
     # Загружаем товар вместе с категорией
     result = await session.execute(
@@ -174,10 +186,16 @@ async def generate_qr(item_id: int, session: AsyncSession = Depends(get_db)):
         "category": item.category.name if item.category else None
     }, ensure_ascii=False)
 
-    qr_img = qrcode.make(payload)
-    buf = BytesIO()
-    qr_img.save(buf, format="PNG")
-    buf.seek(0)
+    def create_qr(data):
+        import qrcode  # qrcode/PIL нужны только здесь — не грузим их при старте приложения
+        qr_img = qrcode.make(data)
+        buf = BytesIO()
+        qr_img.save(buf, format="PNG")
+        buf.seek(0)
+        return buf
+
+    # Генерация картинки — работа CPU, не держим ей цикл событий
+    buf = await asyncio.to_thread(create_qr, payload)
 
     return StreamingResponse(buf, media_type="image/png")
 
@@ -1,5 +1,7 @@
-from fastapi import APIRouter, Depends, Request
-from fastapi.templating import Jinja2Templates
+from typing import Optional
+from fastapi import APIRouter, Depends, Request, Query
+from utils.templating import templates
+from sqlalchemy import tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
@@ -8,16 +10,47 @@ from database.db_depends import get_db
 from models import Log
 from auth import get_current_user
 
-templates = Jinja2Templates(directory="templates")
 router = APIRouter()
 
+LOGS_PAGE_SIZE = 100
+
+
+# Страница журнала от новых к старым; before_id — последняя запись предыдущей страницы.
+# Ключ (timestamp, id): у записей одной секунды время совпадает, id различает их на границе страниц.
+# Фильтры и сортировка совпадают с индексами ix_logs_timestamp_id / ix_logs_user_id_timestamp_id /
+# ix_logs_item_id_timestamp_id
+def logs_query(query, user_id: Optional[int] = None, item_id: Optional[int] = None,
+               before_id: Optional[int] = None, limit: int = LOGS_PAGE_SIZE):
+    if user_id:
+        query = query.where(Log.user_id == user_id)
+    if item_id:
+        query = query.where(Log.item_id == item_id)
+    if before_id:
+        before = select(Log.timestamp).where(Log.id == before_id).scalar_subquery()
+        query = query.where(tuple_(Log.timestamp, Log.id) < tuple_(before, before_id))
+    return query.order_by(Log.timestamp.desc(), Log.id.desc()).limit(limit)
+
+
 @router.get("/logs", response_class=HTMLResponse)
-async def view_logs(request: Request, db: AsyncSession = Depends(get_db), current_user = Depends(get_current_user)):
+async def view_logs(
+    request: Request,
+    user_id: Optional[int] = Query(None),
+    item_id: Optional[int] = Query(None),
+    before_id: Optional[int] = Query(None, ge=1),
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
     # Загружаем пользователя и товар через selectinload
     result = await db.execute(
-        select(Log)
+        logs_query(select(Log), user_id, item_id, before_id)
         .options(selectinload(Log.user), selectinload(Log.item))
-        .order_by(Log.timestamp.desc())
     )
     logs = result.scalars().all()
-    return templates.TemplateResponse("logs.html", {"request": request, "logs": logs, "current_user": current_user})
+    return templates.TemplateResponse("logs.html", {
+        "request": request,
+        "logs": logs,
+        "current_user": current_user,
+        "user_id": user_id,
+        "item_id": item_id,
+        "has_more": len(logs) == LOGS_PAGE_SIZE
+    })
@@ -1,7 +1,13 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Depends
 import uvicorn
+from sqlalchemy import text
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+from utils.templating import templates
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from logs import router as logs
 from items import router as item
 from categories import router as category
@@ -9,24 +15,88 @@ from auth import router as auth
 from users import router as users
 from home import router as home
 from inventory import  router as inv
+from analytics import router as analytics
+from sync import router as sync
+from api import router as api
+from charts import router as charts
 from auth import verify_auth
+from utils.admission import render_metrics
+from utils.scheduler import start_scheduler
+import utils.reports  # noqa: F401 — регистрирует задачу сборки отчёта в планировщике
+import utils.stock  # noqa: F401 — регистрирует задачу сведения истории остатков
+from database.db import engine
 from starlette.exceptions import HTTPException as StarletteHTTPException
-from starlette.status import HTTP_401_UNAUTHORIZED, HTTP_404_NOT_FOUND, HTTP_403_FORBIDDEN
+from starlette.status import (HTTP_401_UNAUTHORIZED, HTTP_404_NOT_FOUND, HTTP_403_FORBIDDEN,
+                              HTTP_429_TOO_MANY_REQUESTS, HTTP_503_SERVICE_UNAVAILABLE)
 
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+# Сколько ждать БД: проверка готовности и прогрев пула при старте. Подключение к недоступной
+# БД само по себе может висеть до таймаута драйвера (у asyncpg — 60 с), поэтому в эти
+# пределы входит и оно, а не только запрос
+READY_TIMEOUT = 2
+WARM_TIMEOUT = float(os.getenv("DB_WARM_TIMEOUT_SECONDS", 5))
+
+
+# Подключение (с pre-ping пула) и SELECT 1
+async def ping_db():
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+# Открываем pool_size соединений одновременно, чтобы первые запросы не ждали подключения
+async def warm_pool():
+    await asyncio.wait_for(
+        asyncio.gather(*[ping_db() for _ in range(engine.pool.size())]),
+        timeout=WARM_TIMEOUT
+    )
+
+
+# Компилируем все шаблоны заранее — они остаются в кэше общего окружения Jinja
+def warm_templates():
+    for name in templates.env.list_templates(extensions=["html"]):
+        templates.env.get_template(name)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.warmed = False
+    warm_templates()
+    try:
+        await warm_pool()
+    except Exception:
+        # Без БД приложение всё равно стартует, /readyz покажет, что оно не готово
+        logger.exception("Не удалось прогреть пул соединений с БД")
+    app.state.warmed = True
+    scheduler = start_scheduler()
+    yield
+    scheduler.cancel()
+    try:
+        await scheduler
+    except asyncio.CancelledError:
+        pass
+    await engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
 
 
 @app.exception_handler(StarletteHTTPException)
 async def custom_http_exception_handler(request: Request, exc: StarletteHTTPException):
+    # JSON API отвечает ошибками в JSON, а не HTML-страницами
+    if request.url.path.startswith("/api/"):
+        return ORJSONResponse({"detail": exc.detail}, status_code=exc.status_code, headers=exc.headers)
     if exc.status_code == HTTP_401_UNAUTHORIZED:
         return templates.TemplateResponse("errors/401.html", {"request": request}, status_code=401)
     if exc.status_code == HTTP_403_FORBIDDEN:
         return templates.TemplateResponse("errors/403.html", {"request": request}, status_code=403)
     if exc.status_code == HTTP_404_NOT_FOUND:
         return templates.TemplateResponse("errors/404.html", {"request": request}, status_code=404)
+    if exc.status_code in (HTTP_429_TOO_MANY_REQUESTS, HTTP_503_SERVICE_UNAVAILABLE):
+        return templates.TemplateResponse("errors/429.html", {"request": request, "status_code": exc.status_code},
+                                          status_code=exc.status_code, headers=exc.headers)
     return templates.TemplateResponse("errors/500.html", {"request": request}, status_code=exc.status_code)
 
 @app.get("/", tags=["Главное Меню"])
@@ -38,6 +108,28 @@ async def welcome(request: Request, error: str = None):
 
 
 
+# Жив ли процесс — без обращения к БД
+@app.get("/healthz", tags=["Служебное"])
+async def healthz():
+    return ORJSONResponse({"status": "ok"})
+
+
+# Готов ли принимать трафик: прогрев завершён и БД отвечает
+@app.get("/readyz", tags=["Служебное"])
+async def readyz():
+    if not getattr(app.state, "warmed", False):
+        return ORJSONResponse({"status": "starting"}, status_code=503)
+    try:
+        await asyncio.wait_for(ping_db(), timeout=READY_TIMEOUT)
+    except Exception:
+        return ORJSONResponse({"status": "db_unavailable"}, status_code=503)
+    return ORJSONResponse({"status": "ready"})
+
+
+@app.get("/metrics", tags=["Служебное"])
+async def metrics():
+    return PlainTextResponse(render_metrics())
+
 
 app.include_router(auth)
 app.include_router(users, dependencies=[Depends(verify_auth)])
@@ -46,6 +138,10 @@ app.include_router(category, dependencies=[Depends(verify_auth)])
 app.include_router(home, dependencies=[Depends(verify_auth)])
 app.include_router(logs, dependencies=[Depends(verify_auth)])
 app.include_router(inv, dependencies=[Depends(verify_auth)])
+app.include_router(analytics, dependencies=[Depends(verify_auth)])
+app.include_router(sync, dependencies=[Depends(verify_auth)])
+app.include_router(api, dependencies=[Depends(verify_auth)])
+app.include_router(charts, dependencies=[Depends(verify_auth)])
 
 
 
@@ -0,0 +1,51 @@
+"""inventory finalization
+
+Проведение инвентаризаций: кто и когда провёл, строки корректировок остатков.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 12:01:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('inventories', sa.Column('finalized_at', sa.DateTime(), nullable=True))
+    op.add_column('inventories', sa.Column('finalized_by', sa.Integer(), nullable=True))
+    op.create_foreign_key('inventories_finalized_by_fkey', 'inventories', 'users', ['finalized_by'], ['id'])
+    op.create_table('inventory_adjustments',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('inventory_id', sa.Integer(), nullable=False),
+    sa.Column('item_id', sa.Integer(), nullable=True),
+    sa.Column('category_id', sa.Integer(), nullable=True),
+    sa.Column('old_qty', sa.Integer(), nullable=False),
+    sa.Column('new_qty', sa.Integer(), nullable=False),
+    sa.Column('difference', sa.Integer(), nullable=False),
+    sa.Column('price', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['inventory_id'], ['inventories.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['item_id'], ['items.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_inventory_adjustments_inventory_id'), 'inventory_adjustments', ['inventory_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_inventory_adjustments_inventory_id'), table_name='inventory_adjustments')
+    op.drop_table('inventory_adjustments')
+    op.drop_constraint('inventories_finalized_by_fkey', 'inventories', type_='foreignkey')
+    op.drop_column('inventories', 'finalized_by')
+    op.drop_column('inventories', 'finalized_at')
@@ -0,0 +1,50 @@
+"""category tree
+
+Категории становятся деревом с материализованным путём. Существующие категории
+становятся корневыми: path = '/<id>/', depth = 0. Уникальность имени теперь
+в пределах родителя, а не по всему справочнику; корневые категории (parent_id IS NULL)
+тоже считаются одним родителем — NULLS NOT DISTINCT, Postgres 15+.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 12:02:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('categories', sa.Column('parent_id', sa.Integer(), nullable=True))
+    op.add_column('categories', sa.Column('path', sa.String(), nullable=True))
+    op.add_column('categories', sa.Column('depth', sa.Integer(), nullable=True))
+    op.create_foreign_key('categories_parent_id_fkey', 'categories', 'categories', ['parent_id'], ['id'])
+
+    op.execute("UPDATE categories SET path = '/' || id || '/', depth = 0")
+    op.alter_column('categories', 'path', nullable=False)
+    op.alter_column('categories', 'depth', nullable=False)
+
+    op.drop_constraint('categories_name_key', 'categories', type_='unique')
+    op.create_unique_constraint('uq_categories_parent_name', 'categories', ['parent_id', 'name'], postgresql_nulls_not_distinct=True)
+    op.create_index('ix_categories_path', 'categories', ['path'], unique=False, postgresql_ops={'path': 'text_pattern_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_categories_path', table_name='categories', postgresql_ops={'path': 'text_pattern_ops'})
+    op.drop_constraint('uq_categories_parent_name', 'categories', type_='unique')
+    op.create_unique_constraint('categories_name_key', 'categories', ['name'])
+    op.drop_constraint('categories_parent_id_fkey', 'categories', type_='foreignkey')
+    op.drop_column('categories', 'depth')
+    op.drop_column('categories', 'path')
+    op.drop_column('categories', 'parent_id')
@@ -0,0 +1,64 @@
+"""sync versions
+
+Номера версий для синхронизации с терминалами: общая последовательность change_version_seq,
+столбец version в синхронизируемых таблицах и записи об удалениях. Существующим строкам
+версии выдаются из той же последовательности. txid — транзакция, записавшая строку:
+по нему /sync/changes не отдаёт изменения, которые ещё могут обогнать незавершённые транзакции.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 12:03:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+VERSIONED_TABLES = ['categories', 'items', 'inventories', 'inventory_items']
+CURRENT_TXID = sa.text("(pg_current_xact_id())::text::bigint")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(sa.schema.CreateSequence(sa.Sequence('change_version_seq')))
+
+    for table in VERSIONED_TABLES:
+        op.add_column(table, sa.Column('version', sa.BigInteger(), nullable=True))
+        op.execute(f"UPDATE {table} SET version = nextval('change_version_seq')")
+        op.alter_column(table, 'version', nullable=False, server_default=sa.text("nextval('change_version_seq')"))
+        op.create_index(op.f(f'ix_{table}_version'), table, ['version'], unique=False)
+        # Существующие строки записаны давно завершёнными транзакциями
+        op.add_column(table, sa.Column('txid', sa.BigInteger(), nullable=False, server_default='0'))
+        op.alter_column(table, 'txid', server_default=CURRENT_TXID)
+        op.create_index(op.f(f'ix_{table}_txid'), table, ['txid'], unique=False)
+
+    op.create_table('sync_tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entity', sa.String(), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), server_default=sa.text("nextval('change_version_seq')"), nullable=False),
+    sa.Column('txid', sa.BigInteger(), server_default=CURRENT_TXID, nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_sync_tombstones_version'), 'sync_tombstones', ['version'], unique=False)
+    op.create_index(op.f('ix_sync_tombstones_txid'), 'sync_tombstones', ['txid'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_sync_tombstones_version'), table_name='sync_tombstones')
+    op.drop_table('sync_tombstones')
+    for table in reversed(VERSIONED_TABLES):
+        op.drop_index(op.f(f'ix_{table}_txid'), table_name=table)
+        op.drop_column(table, 'txid')
+        op.drop_index(op.f(f'ix_{table}_version'), table_name=table)
+        op.drop_column(table, 'version')
+    op.execute(sa.schema.DropSequence(sa.Sequence('change_version_seq')))
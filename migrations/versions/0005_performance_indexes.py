@@ -0,0 +1,51 @@
+"""performance indexes
+
+Индексы под горячие запросы: товары по категории (/home, /api/v1/items), журнал по времени,
+пользователю и товару (/logs), строки инвентаризации по инвентаризации (просмотр, проведение,
+/api/v1), список инвентаризаций по дате. Создаются CONCURRENTLY, чтобы не блокировать запись.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 12:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index('ix_inventories_created_at_id', 'inventories', ['created_at', 'id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_inventories_finalized_at', 'inventories', ['finalized_at'], unique=False, postgresql_concurrently=True)
+        op.create_index(op.f('ix_inventory_adjustments_item_id'), 'inventory_adjustments', ['item_id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_inventory_items_inventory_id_id', 'inventory_items', ['inventory_id', 'id'], unique=False, postgresql_include=['item_id', 'expected_qty', 'actual_qty', 'difference'], postgresql_concurrently=True)
+        op.create_index('ix_inventory_items_item_id', 'inventory_items', ['item_id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_items_category_id_id', 'items', ['category_id', 'id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_logs_item_id_timestamp_id', 'logs', ['item_id', 'timestamp', 'id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_logs_timestamp_id', 'logs', ['timestamp', 'id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_logs_user_id_timestamp_id', 'logs', ['user_id', 'timestamp', 'id'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_logs_user_id_timestamp_id', table_name='logs', postgresql_concurrently=True)
+        op.drop_index('ix_logs_timestamp_id', table_name='logs', postgresql_concurrently=True)
+        op.drop_index('ix_logs_item_id_timestamp_id', table_name='logs', postgresql_concurrently=True)
+        op.drop_index('ix_items_category_id_id', table_name='items', postgresql_concurrently=True)
+        op.drop_index('ix_inventory_items_item_id', table_name='inventory_items', postgresql_concurrently=True)
+        op.drop_index('ix_inventory_items_inventory_id_id', table_name='inventory_items', postgresql_include=['item_id', 'expected_qty', 'actual_qty', 'difference'], postgresql_concurrently=True)
+        op.drop_index(op.f('ix_inventory_adjustments_item_id'), table_name='inventory_adjustments', postgresql_concurrently=True)
+        op.drop_index('ix_inventories_finalized_at', table_name='inventories', postgresql_concurrently=True)
+        op.drop_index('ix_inventories_created_at_id', table_name='inventories', postgresql_concurrently=True)
+
@@ -0,0 +1,31 @@
+"""scheduler lease
+
+Аренда задачи планировщика: воркер отмечает, до какого времени задача за ним, и не держит
+строку заблокированной всю сборку.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 14:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, Sequence[str], None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('scheduled_jobs', sa.Column('lease_until', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('scheduled_jobs', 'lease_until')
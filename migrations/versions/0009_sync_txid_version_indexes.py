@@ -0,0 +1,40 @@
+"""sync txid version indexes
+
+Составные индексы (txid, version) под выборку /sync/changes вместо индексов по одному txid:
+транзакция может записать сотни тысяч строк с одним txid, и без version в индексе каждая
+пачка перечитывала бы и сортировала их все. Создаются CONCURRENTLY.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 14:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, Sequence[str], None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SYNC_TABLES = ['categories', 'items', 'inventories', 'inventory_items', 'sync_tombstones']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for table in SYNC_TABLES:
+            op.create_index(f'ix_{table}_txid_version', table, ['txid', 'version'], unique=False, postgresql_concurrently=True)
+            op.drop_index(f'ix_{table}_txid', table_name=table, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for table in reversed(SYNC_TABLES):
+            op.create_index(f'ix_{table}_txid', table, ['txid'], unique=False, postgresql_concurrently=True)
+            op.drop_index(f'ix_{table}_txid_version', table_name=table, postgresql_concurrently=True)
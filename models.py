@@ -1,9 +1,41 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Float, Enum, Text
+from sqlalchemy import (Column, Integer, BigInteger, String, DateTime, Boolean, ForeignKey, Float, Enum, Text,
+                        Index, UniqueConstraint, Sequence, JSON, LargeBinary)
+from sqlalchemy import cast, func
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
 from database.db import Base
 
+# Общий счётчик изменений для синхронизации с терминалами: каждая вставка и изменение
+# товара, категории, инвентаризации или её строки получает следующий номер версии
+change_version_seq = Sequence("change_version_seq", metadata=Base.metadata)
+
+
+def version_column():
+    return Column(
+        BigInteger,
+        nullable=False,
+        index=True,
+        server_default=change_version_seq.next_value(),
+        onupdate=change_version_seq.next_value()
+    )
+
+
+# Номер транзакции, записавшей строку. Версия выдаётся при выполнении запроса, а видна строка
+# становится только после коммита, поэтому /sync/changes отдаёт строки лишь тех транзакций,
+# которые старше всех ещё не завершённых, и идёт по паре (txid, version)
+def current_txid():
+    return cast(cast(func.pg_current_xact_id(), Text), BigInteger)
+
+
+def txid_column():
+    return Column(BigInteger, nullable=False, server_default=current_txid(), onupdate=current_txid())
+
+
+# Индекс под выборку /sync/changes: WHERE (txid, version) > курсор ORDER BY txid, version
+def txid_version_index(table: str):
+    return Index(f"ix_{table}_txid_version", "txid", "version")
+
 class User(Base):
     __tablename__ = "users"
 
@@ -14,17 +46,37 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)  # <-- флаг администратора
 
+# Иерархия склада (площадка → зона → стеллаж → категория) хранится материализованным путём:
+# path = "/1/4/9/" — id всех предков и самой категории. Поддерево — это path LIKE '/1/4/%'.
 class Category(Base):
     __tablename__ = "categories"
+    __table_args__ = (
+        # NULLS NOT DISTINCT (Postgres 15+): иначе у корневых категорий (parent_id IS NULL)
+        # имена не проверялись бы на совпадение
+        UniqueConstraint("parent_id", "name", name="uq_categories_parent_name", postgresql_nulls_not_distinct=True),
+        Index("ix_categories_path", "path", postgresql_ops={"path": "text_pattern_ops"}),
+        txid_version_index("categories"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, nullable=False, unique=True)
+    name = Column(String, nullable=False)
+    parent_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
+    path = Column(String, nullable=False, default="/")
+    depth = Column(Integer, nullable=False, default=0)
+    version = version_column()
+    txid = txid_column()
 
     items = relationship("Item", back_populates="category")
+    parent = relationship("Category", remote_side=[id])
 
 
 class Item(Base):
     __tablename__ = "items"
+    __table_args__ = (
+        # Фильтр по категории с сортировкой по id (главная страница, /api/v1/items)
+        Index("ix_items_category_id_id", "category_id", "id"),
+        txid_version_index("items"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -33,6 +85,9 @@ class Item(Base):
     price = Column(Float, nullable=False, default=0.0)
 
     category_id = Column(Integer, ForeignKey("categories.id"))
+    version = version_column()
+    txid = txid_column()
+
     category = relationship("Category", back_populates="items")
 
 
@@ -45,6 +100,11 @@ class ActionType(str, enum.Enum):
 # models.py
 class Log(Base):
     __tablename__ = "logs"
+    __table_args__ = (
+        Index("ix_logs_timestamp_id", "timestamp", "id"),
+        Index("ix_logs_user_id_timestamp_id", "user_id", "timestamp", "id"),
+        Index("ix_logs_item_id_timestamp_id", "item_id", "timestamp", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -58,18 +118,35 @@ class Log(Base):
 
 class Inventory(Base):
     __tablename__ = "inventories"
+    __table_args__ = (
+        Index("ix_inventories_created_at_id", "created_at", "id"),
+        Index("ix_inventories_finalized_at", "finalized_at"),
+        txid_version_index("inventories"),
+    )
 
     id = Column(Integer, primary_key=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     created_by = Column(Integer, ForeignKey("users.id"))
+    finalized_at = Column(DateTime, nullable=True)  # None — инвентаризация ещё открыта
+    finalized_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    version = version_column()
+    txid = txid_column()
 
     items = relationship("InventoryItem", back_populates="inventory", cascade="all, delete-orphan")
-    created_by_user = relationship("User")  # новая связь
+    created_by_user = relationship("User", foreign_keys=[created_by])  # новая связь
+    finalized_by_user = relationship("User", foreign_keys=[finalized_by])
 
 
 
 class InventoryItem(Base):
     __tablename__ = "inventory_items"
+    __table_args__ = (
+        # Строки одной инвентаризации по порядку id; INCLUDE позволяет читать их только из индекса
+        Index("ix_inventory_items_inventory_id_id", "inventory_id", "id",
+              postgresql_include=["item_id", "expected_qty", "actual_qty", "difference"]),
+        Index("ix_inventory_items_item_id", "item_id"),
+        txid_version_index("inventory_items"),
+    )
     id = Column(Integer, primary_key=True)
     inventory_id = Column(Integer, ForeignKey("inventories.id", ondelete="CASCADE"))
     item_id = Column(Integer, ForeignKey("items.id", ondelete="CASCADE"))
@@ -77,8 +154,115 @@ class InventoryItem(Base):
     expected_qty = Column(Integer, nullable=False)   # Ожидалось
     actual_qty = Column(Integer, nullable=True)     # Фактически
     difference = Column(Integer, nullable=True)
+    version = version_column()
+    txid = txid_column()
 
     inventory = relationship("Inventory", back_populates="items")
     item = relationship("Item")
 
 
+# Проведённые по итогам инвентаризации корректировки остатков.
+# Категория и цена копируются на момент проведения, чтобы история не менялась вместе с товаром.
+class InventoryAdjustment(Base):
+    __tablename__ = "inventory_adjustments"
+
+    id = Column(Integer, primary_key=True)
+    inventory_id = Column(Integer, ForeignKey("inventories.id", ondelete="CASCADE"), nullable=False, index=True)
+    item_id = Column(Integer, ForeignKey("items.id", ondelete="SET NULL"), nullable=True, index=True)
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="SET NULL"), nullable=True)
+
+    old_qty = Column(Integer, nullable=False)     # Остаток до проведения
+    new_qty = Column(Integer, nullable=False)     # Остаток после проведения: old_qty + difference
+    difference = Column(Integer, nullable=False)  # Факт минус ожидание
+    price = Column(Float, nullable=False, default=0.0)
+
+    inventory = relationship("Inventory")
+    item = relationship("Item", passive_deletes=True)
+    category = relationship("Category")
+
+
+# Удалённые записи для синхронизации: терминал узнаёт об удалении по версии, как и об изменении
+class SyncTombstone(Base):
+    __tablename__ = "sync_tombstones"
+    __table_args__ = (
+        txid_version_index("sync_tombstones"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    entity = Column(String, nullable=False)  # "item" или "category"
+    entity_id = Column(Integer, nullable=False)
+    version = version_column()
+    txid = txid_column()
+
+
+# Фоновые задачи планировщика (utils/scheduler.py). Состояние хранится в БД, поэтому
+# расписание переживает перезапуск, а строку задачи блокирует только один воркер.
+class ScheduledJob(Base):
+    __tablename__ = "scheduled_jobs"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+    next_run_at = Column(DateTime, nullable=True)       # ближайший запуск по расписанию
+    requested_at = Column(DateTime, nullable=True)      # запрошен внеочередной запуск
+    last_started_at = Column(DateTime, nullable=True)
+    last_finished_at = Column(DateTime, nullable=True)
+    last_change_version = Column(BigInteger, nullable=True)  # change_version_seq на момент запуска
+    last_error = Column(Text, nullable=True)
+    cursor_at = Column(DateTime, nullable=True)  # до какого момента задача уже обработала данные
+    lease_until = Column(DateTime, nullable=True)  # задачу выполняет воркер, захвативший её до этого времени
+
+
+# Готовый складской отчёт: данные для страницы и файлы для выгрузки
+class ReportSnapshot(Base):
+    __tablename__ = "report_snapshots"
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    change_version = Column(BigInteger, nullable=True)
+    build_seconds = Column(Float, nullable=False, default=0.0)
+    data = Column(JSON, nullable=False)  # строки и итоги для inventory_report.html
+    xlsx = Column(LargeBinary, nullable=False)
+    csv = Column(LargeBinary, nullable=False)
+
+
+# Изменения остатков для графиков (utils/stock.py): на сколько изменились количество и стоимость
+# товара. Путь категории копируется на момент изменения, а внешнего ключа на товар нет —
+# история остаётся и после удаления товара или категории.
+class StockPoint(Base):
+    __tablename__ = "stock_points"
+
+    id = Column(BigInteger, primary_key=True)
+    recorded_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    item_id = Column(Integer, nullable=False)
+    category_path = Column(String, nullable=True)
+    qty_delta = Column(Integer, nullable=False)
+    value_delta = Column(Float, nullable=False)
+
+
+# Остаток на конец часа/дня по ряду: "item:<id>", "category:<id>" (всё поддерево) или "total".
+# Строка есть только для интервалов, в которых ряд менялся; в остальных действует предыдущее значение.
+class StockRollup(Base):
+    __tablename__ = "stock_rollups"
+    __table_args__ = (
+        UniqueConstraint("bucket", "series", "bucket_start", name="uq_stock_rollups_bucket_series_start"),
+        Index("ix_stock_rollups_bucket_bucket_start", "bucket", "bucket_start"),
+    )
+
+    id = Column(BigInteger, primary_key=True)
+    bucket = Column(String, nullable=False)  # "hour" или "day"
+    series = Column(String, nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    quantity = Column(BigInteger, nullable=False)
+    value = Column(Float, nullable=False)
+    quantity_min = Column(BigInteger, nullable=False)
+    quantity_max = Column(BigInteger, nullable=False)
+
+
+# Текущий остаток каждого ряда на момент последнего сведения — от него считаются следующие часы
+class StockLevel(Base):
+    __tablename__ = "stock_levels"
+
+    series = Column(String, primary_key=True)
+    quantity = Column(BigInteger, nullable=False)
+    value = Column(Float, nullable=False)
+    as_of = Column(DateTime, nullable=False)
@@ -0,0 +1,85 @@
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel, Field
+
+
+# Поля ответа необязательные: клиент может запросить только часть через ?fields=
+class ItemOut(BaseModel):
+    id: int
+    name: Optional[str] = None
+    description: Optional[str] = None
+    quantity: Optional[int] = None
+    price: Optional[float] = None
+    category_id: Optional[int] = None
+    version: Optional[int] = None
+
+
+class ItemPage(BaseModel):
+    items: list[ItemOut]
+    next_after_id: Optional[int] = None
+
+
+class ItemWrite(BaseModel):
+    id: Optional[int] = None  # есть id — обновление, нет — создание
+    name: str
+    description: str = ""
+    quantity: int
+    price: float
+    category_id: Optional[int] = None
+
+
+class ItemBulkWrite(BaseModel):
+    items: list[ItemWrite] = Field(max_length=5000)
+
+
+class ItemBulkResult(BaseModel):
+    created: list[int]
+    updated: int
+
+
+class CategoryOut(BaseModel):
+    id: int
+    name: str
+    parent_id: Optional[int] = None
+    path: str
+    depth: int
+
+
+class InventoryOut(BaseModel):
+    id: int
+    created_at: Optional[datetime] = None
+    created_by: Optional[int] = None
+    finalized_at: Optional[datetime] = None
+    finalized_by: Optional[int] = None
+
+
+class InventoryPage(BaseModel):
+    inventories: list[InventoryOut]
+    next_after_id: Optional[int] = None
+
+
+class InventoryLineOut(BaseModel):
+    id: int
+    item_id: Optional[int] = None
+    expected_qty: int
+    actual_qty: Optional[int] = None
+    difference: Optional[int] = None
+
+
+class InventoryLinePage(BaseModel):
+    lines: list[InventoryLineOut]
+    next_after_id: Optional[int] = None
+
+
+class LogOut(BaseModel):
+    id: int
+    user_id: Optional[int] = None
+    item_id: Optional[int] = None
+    action: Optional[str] = None
+    description: Optional[str] = None
+    timestamp: Optional[datetime] = None
+
+
+class LogPage(BaseModel):
+    logs: list[LogOut]
+    next_before_id: Optional[int] = None
@@ -0,0 +1,169 @@
+from fastapi import APIRouter, Depends, Query, HTTPException
+from pydantic import BaseModel, Field
+from sqlalchemy import update, func, cast, tuple_, Text, BigInteger
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from database.db_depends import get_db
+from models import Item, Category, Inventory, InventoryItem, SyncTombstone
+
+router = APIRouter(prefix="/sync", tags=["Sync"])
+
+MAX_BATCH = 2000
+MAX_UPLOAD = 5000
+
+# Что отдаём терминалам: сущность -> (модель, столбцы). Версия всегда последним столбцом.
+SYNC_ENTITIES = {
+    "categories": (Category, [Category.id, Category.name, Category.parent_id, Category.path, Category.version]),
+    "items": (Item, [Item.id, Item.name, Item.description, Item.quantity, Item.price, Item.category_id,
+                     Item.version]),
+    "inventories": (Inventory, [Inventory.id, Inventory.created_at, Inventory.finalized_at, Inventory.version]),
+    "inventory_lines": (InventoryItem, [InventoryItem.id, InventoryItem.inventory_id, InventoryItem.item_id,
+                                        InventoryItem.expected_qty, InventoryItem.actual_qty,
+                                        InventoryItem.version]),
+    "deleted": (SyncTombstone, [SyncTombstone.entity, SyncTombstone.entity_id, SyncTombstone.version]),
+}
+
+
+class OfflineCount(BaseModel):
+    line_id: int
+    actual_qty: int = Field(ge=0)
+    base_version: int  # версия строки, которую видел терминал, когда считал
+
+
+class CountUpload(BaseModel):
+    counts: list[OfflineCount]
+
+
+# Курсор — "txid:version" последнего отданного изменения ("0:0" — с начала)
+def parse_cursor(cursor: str):
+    txid, _, version = cursor.partition(":")
+    if not (txid.isdigit() and version.isdigit()):
+        raise HTTPException(status_code=400, detail="cursor должен иметь вид txid:version")
+    return int(txid), int(version)
+
+
+# Изменения одной сущности после курсора after = (txid, version), только транзакций старше xmin.
+# Условие и сортировка совпадают с индексом ix_<таблица>_txid_version: одна транзакция может
+# записать сотни тысяч строк с одним txid, и каждая пачка должна начинаться с курсора, а не
+# перечитывать и сортировать их все
+def changes_query(entity: str, after: tuple[int, int], xmin: int, limit: int):
+    model, columns = SYNC_ENTITIES[entity]
+    query = (
+        select(*columns, model.txid)
+        .where(tuple_(model.txid, model.version) > tuple_(*after), model.txid < xmin)
+        .order_by(model.txid, model.version)
+        .limit(limit)
+    )
+    if model is InventoryItem:
+        # Строки проведённых инвентаризаций терминалу не нужны
+        query = query.join(Inventory, Inventory.id == InventoryItem.inventory_id).where(
+            Inventory.finalized_at.is_(None)
+        )
+    return query
+
+
+# Изменения после курсора. Отдаются только строки транзакций, которые старше всех ещё
+# выполняющихся (txid < xmin снимка): такие строки уже не изменятся задним числом, а всё,
+# что запишут выполняющиеся транзакции, получит txid не меньше xmin и придёт следующими пачками.
+# Пачки из разных таблиц сливаются по (txid, version), и отдаются первые limit изменений.
+@router.get("/changes")
+async def get_changes(
+    cursor: str = Query("0:0"),
+    limit: int = Query(500, ge=1, le=MAX_BATCH),
+    db: AsyncSession = Depends(get_db)
+):
+    after = parse_cursor(cursor)
+    xmin = (
+        await db.execute(select(cast(cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text), BigInteger)))
+    ).scalar()
+
+    changes = []
+    for entity in SYNC_ENTITIES:
+        result = await db.execute(changes_query(entity, after, xmin, limit + 1))
+        changes.extend(((row[-1], row[-2]), entity, list(row[:-1])) for row in result.all())
+
+    changes.sort(key=lambda change: change[0])
+    batch = changes[:limit]
+
+    payload = {
+        entity: {"columns": [column.key for column in columns], "rows": []}
+        for entity, (_, columns) in SYNC_ENTITIES.items()
+    }
+    for _, entity, row in batch:
+        payload[entity]["rows"].append(row)
+
+    return {
+        "cursor": "{}:{}".format(*batch[-1][0]) if batch else cursor,
+        "has_more": len(changes) > limit,
+        "changes": payload
+    }
+
+
+# Загрузка пересчётов, накопленных терминалом без связи.
+# Конфликт: если строку уже пересчитали после версии, которую видел терминал, и значения
+# расходятся — остаётся серверное значение, терминал получает его в ответе.
+@router.post("/counts")
+async def upload_counts(upload: CountUpload, db: AsyncSession = Depends(get_db)):
+    if len(upload.counts) > MAX_UPLOAD:
+        raise HTTPException(status_code=413, detail=f"Не больше {MAX_UPLOAD} строк за раз")
+
+    # Последний пересчёт одной строки в пачке — актуальный
+    counts = {count.line_id: count for count in upload.counts}
+
+    lines = {
+        line.id: line
+        for line in (
+            await db.execute(
+                select(
+                    InventoryItem.id,
+                    InventoryItem.inventory_id,
+                    InventoryItem.expected_qty,
+                    InventoryItem.actual_qty,
+                    InventoryItem.version
+                )
+                .where(InventoryItem.id.in_(list(counts)))
+                .with_for_update()
+            )
+        ).all()
+    }
+
+    # FOR SHARE по инвентаризациям: проведение не пройдёт посреди загрузки, и наоборот
+    inv_ids = {line.inventory_id for line in lines.values()}
+    finalized = {
+        inv_id
+        for inv_id, finalized_at in (
+            await db.execute(
+                select(Inventory.id, Inventory.finalized_at)
+                .where(Inventory.id.in_(inv_ids))
+                .with_for_update(read=True)
+            )
+        ).all()
+        if finalized_at is not None
+    }
+
+    results = []
+    to_apply = []
+    for line_id, count in counts.items():
+        line = lines.get(line_id)
+        if line is None:
+            results.append({"line_id": line_id, "status": "missing"})
+        elif line.inventory_id in finalized:
+            results.append({"line_id": line_id, "status": "finalized", "actual_qty": line.actual_qty})
+        elif (line.version != count.base_version and line.actual_qty is not None
+              and line.actual_qty != count.actual_qty):
+            results.append({"line_id": line_id, "status": "conflict", "actual_qty": line.actual_qty,
+                            "version": line.version})
+        else:
+            to_apply.append({
+                "id": line_id,
+                "actual_qty": count.actual_qty,
+                "difference": count.actual_qty - line.expected_qty
+            })
+            results.append({"line_id": line_id, "status": "applied", "actual_qty": count.actual_qty})
+
+    if to_apply:
+        # Одна пакетная запись по первичному ключу
+        await db.execute(update(InventoryItem), to_apply)
+    await db.commit()
+
+    return {"results": results}
@@ -1,20 +1,17 @@
 from fastapi import Request, Form, APIRouter, HTTPException, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from passlib.context import CryptContext
 from fastapi.responses import RedirectResponse, HTMLResponse
-from auth import get_current_user
+from auth import get_current_user, get_pwd_context
 from database.db_depends import get_db
 from models import User
-from fastapi.templating import Jinja2Templates
+from utils.templating import templates
 
 async def require_admin(user: User = Depends(get_current_user)):
     if not user.is_admin:
         raise HTTPException(status_code=403, detail="Admins only")
     return user
 
-templates = Jinja2Templates(directory="templates")
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 router = APIRouter(prefix='/admin-panel',
                    tags=['Admin-panel'],)
 
@@ -41,7 +38,7 @@ async def create_user(
     if result.scalars().first():
         raise HTTPException(status_code=400, detail="Username already exists")
 
-    hashed_password = pwd_context.hash(password)
+    hashed_password = get_pwd_context().hash(password)
     new_user = User(
         name=name,
         post=post,
@@ -0,0 +1,170 @@
+import asyncio
+import math
+import os
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable
+from fastapi import HTTPException, Request
+from utils.tokens import get_token, decode_token
+
+# Ограничение нагрузки на тяжёлые маршруты: общий лимит одновременных запросов с ограниченной
+# очередью, лимит одновременных запросов одного пользователя и token bucket на частоту.
+# Лишние запросы сразу получают 429/503 с Retry-After вместо того, чтобы копиться в воркере.
+
+# Значения по умолчанию; любое можно переопределить переменной окружения
+# ADMISSION_<МАРШРУТ>_<ПАРАМЕТР>, например ADMISSION_REPORT_CONCURRENCY=4
+DEFAULT_LIMITS = {
+    # concurrency — одновременно на маршрут, per_user — одновременно на пользователя,
+    # queue — сколько запросов может ждать, wait_timeout — сколько секунд ждать,
+    # rate/burst — запросов в секунду на пользователя и размер всплеска
+    "report": {"concurrency": 2, "per_user": 1, "queue": 4, "wait_timeout": 10.0, "rate": 0.2, "burst": 2},
+    "inventory_start": {"concurrency": 1, "per_user": 1, "queue": 2, "wait_timeout": 10.0, "rate": 0.1, "burst": 1},
+    "qr": {"concurrency": 4, "per_user": 2, "queue": 16, "wait_timeout": 5.0, "rate": 5.0, "burst": 10},
+    "login": {"concurrency": 4, "per_user": 2, "queue": 16, "wait_timeout": 5.0, "rate": 0.5, "burst": 5},
+}
+
+MAX_TRACKED_CLIENTS = 10_000
+
+
+def _setting(route: str, name: str, default):
+    value = os.getenv(f"ADMISSION_{route.upper()}_{name.upper()}")
+    return type(default)(value) if value is not None else default
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+# Кто делает запрос: пользователь из токена, а без действительного токена — IP
+async def client_key(request: Request) -> str:
+    token = get_token(request)
+    username = decode_token(token) if token else None
+    if username:
+        return f"user:{username}"
+    return f"ip:{client_ip(request)}"
+
+
+# Вход: токена ещё нет, поэтому ключ — введённое имя и IP. Подбор пароля к одной учётной записи
+# упирается в лимит, а сотрудники за общим NAT не отнимают попытки друг у друга.
+# Форму FastAPI уже разобрал для обработчика — request.form() возвращает её из кэша запроса
+async def login_key(request: Request) -> str:
+    form = await request.form()
+    return f"login:{form.get('username', '')}@{client_ip(request)}"
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    # 0 — запрос пропущен, иначе через сколько секунд появится токен
+    def take(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def is_full(self) -> bool:
+        return self.tokens + (time.monotonic() - self.updated) * self.rate >= self.burst
+
+
+class RouteLimiter:
+    def __init__(self, name: str, key: Callable[[Request], Awaitable[str]] = client_key):
+        self.name = name
+        self.key = key
+        defaults = DEFAULT_LIMITS[name]
+        self.concurrency = _setting(name, "concurrency", defaults["concurrency"])
+        self.per_user = _setting(name, "per_user", defaults["per_user"])
+        self.queue = _setting(name, "queue", defaults["queue"])
+        self.wait_timeout = _setting(name, "wait_timeout", defaults["wait_timeout"])
+        self.rate = _setting(name, "rate", defaults["rate"])
+        self.burst = _setting(name, "burst", defaults["burst"])
+
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.buckets: dict[str, TokenBucket] = {}
+        self.user_active: dict[str, int] = defaultdict(int)
+        self.active = 0
+        self.waiting = 0
+        self.counters = {"admitted": 0, "rate_limited": 0, "user_limited": 0, "queue_full": 0, "timed_out": 0}
+
+    def _bucket(self, key: str) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= MAX_TRACKED_CLIENTS:
+                # Полные корзины ничего не помнят — их можно выбросить
+                self.buckets = {k: b for k, b in self.buckets.items() if not b.is_full()}
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def _shed(self, reason: str, status_code: int, retry_after: float):
+        self.counters[reason] += 1
+        raise HTTPException(
+            status_code=status_code,
+            detail="Слишком много запросов, попробуйте позже",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+    # Зависимость FastAPI: держит слот на всё время выполнения обработчика
+    async def __call__(self, request: Request):
+        key = await self.key(request)
+
+        retry_after = self._bucket(key).take()
+        if retry_after:
+            self._shed("rate_limited", 429, retry_after)
+        if self.user_active[key] >= self.per_user:
+            self._shed("user_limited", 429, 1)
+        if self.semaphore.locked() and self.waiting >= self.queue:
+            self._shed("queue_full", 503, self.wait_timeout)
+
+        self.user_active[key] += 1
+        try:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), self.wait_timeout)
+            except asyncio.TimeoutError:
+                self._shed("timed_out", 503, self.wait_timeout)
+            finally:
+                self.waiting -= 1
+
+            self.counters["admitted"] += 1
+            self.active += 1
+            try:
+                yield
+            finally:
+                self.active -= 1
+                self.semaphore.release()
+        finally:
+            self.user_active[key] -= 1
+            if not self.user_active[key]:
+                del self.user_active[key]
+
+
+report_limit = RouteLimiter("report")
+inventory_start_limit = RouteLimiter("inventory_start")
+qr_limit = RouteLimiter("qr")
+login_limit = RouteLimiter("login", key=login_key)
+
+LIMITERS = [report_limit, inventory_start_limit, qr_limit, login_limit]
+
+
+# Метрики в текстовом формате Prometheus
+def render_metrics() -> str:
+    lines = [
+        "# TYPE admission_requests_total counter",
+        "# TYPE admission_active gauge",
+        "# TYPE admission_waiting gauge",
+        "# TYPE admission_concurrency_limit gauge",
+    ]
+    for limiter in LIMITERS:
+        route = f'route="{limiter.name}"'
+        for outcome, count in limiter.counters.items():
+            lines.append(f'admission_requests_total{{{route},outcome="{outcome}"}} {count}')
+        lines.append(f"admission_active{{{route}}} {limiter.active}")
+        lines.append(f"admission_waiting{{{route}}} {limiter.waiting}")
+        lines.append(f"admission_concurrency_limit{{{route}}} {limiter.concurrency}")
+    return "\n".join(lines) + "\n"
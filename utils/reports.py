@@ -0,0 +1,110 @@
+import asyncio
+import csv
+import os
+import time
+from io import BytesIO, StringIO
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
+from sqlalchemy.future import select
+from models import Item, Category, ReportSnapshot
+from utils.scheduler import register_job, parse_times, current_change_version
+
+# Складской отчёт собирается заранее планировщиком: по расписанию REPORT_SCHEDULE (UTC),
+# после REPORT_CHANGE_THRESHOLD изменений товаров/инвентаризаций и по кнопке «Обновить».
+# Страница и выгрузки отдают последний готовый снимок.
+REPORT_JOB = "inventory_report"
+REPORT_SCHEDULE = os.getenv("REPORT_SCHEDULE", "03:00,09:00,13:00")
+REPORT_CHANGE_THRESHOLD = int(os.getenv("REPORT_CHANGE_THRESHOLD", 500))
+REPORT_KEEP = int(os.getenv("REPORT_KEEP", 20))  # сколько последних снимков хранить
+
+COLUMNS = ["Название", "Категория", "Количество", "Цена", "Сумма"]
+
+
+async def collect_report_data(db: AsyncSession):
+    result = await db.execute(
+        select(Item.name, Category.name, Item.quantity, Item.price)
+        .outerjoin(Category, Category.id == Item.category_id)
+        .order_by(Item.id)
+    )
+    items = []
+    total_quantity = 0
+    total_value = 0
+    for name, category, quantity, price in result.all():
+        qty = quantity or 0
+        price = price or 0
+        total = qty * price
+        total_quantity += qty
+        total_value += total
+        items.append({
+            "name": name,
+            "category": category or "-",
+            "quantity": qty,
+            "price": price,
+            "total_value": total
+        })
+    return {"items": items, "total_quantity": total_quantity, "total_value": total_value}
+
+
+def table_rows(data):
+    rows = [[it["name"], it["category"], it["quantity"], it["price"], it["total_value"]] for it in data["items"]]
+    rows.append(["Итого", "", data["total_quantity"], "", data["total_value"]])
+    return rows
+
+
+def render_xlsx(data) -> bytes:
+    import pandas as pd  # pandas/openpyxl нужны только для выгрузки — не грузим их при старте
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        pd.DataFrame(table_rows(data), columns=COLUMNS).to_excel(writer, index=False, sheet_name="Отчет")
+    return output.getvalue()
+
+
+def render_csv(data) -> bytes:
+    output = StringIO()
+    writer = csv.writer(output, delimiter=";")
+    writer.writerow(COLUMNS)
+    writer.writerows(table_rows(data))
+    return output.getvalue().encode("utf-8-sig")  # BOM — чтобы Excel открыл кириллицу
+
+
+# Задача планировщика: собрать снимок и удалить старые
+async def build_report_snapshot(db: AsyncSession):
+    started = time.perf_counter()
+    version = await current_change_version(db)
+    data = await collect_report_data(db)
+    xlsx, csv_bytes = await asyncio.to_thread(lambda: (render_xlsx(data), render_csv(data)))
+
+    db.add(ReportSnapshot(
+        change_version=version,
+        build_seconds=time.perf_counter() - started,
+        data=data,
+        xlsx=xlsx,
+        csv=csv_bytes
+    ))
+    await db.flush()
+
+    keep = select(ReportSnapshot.id).order_by(ReportSnapshot.id.desc()).limit(REPORT_KEEP)
+    await db.execute(delete(ReportSnapshot).where(ReportSnapshot.id.not_in(keep)))
+
+
+# Последний снимок без файлов выгрузки — для страницы отчёта
+async def latest_snapshot(db: AsyncSession):
+    result = await db.execute(
+        select(ReportSnapshot)
+        .options(defer(ReportSnapshot.xlsx), defer(ReportSnapshot.csv))
+        .order_by(ReportSnapshot.id.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+# Время и содержимое файла последнего снимка (column — ReportSnapshot.xlsx или ReportSnapshot.csv)
+async def latest_snapshot_file(db: AsyncSession, column):
+    result = await db.execute(
+        select(ReportSnapshot.created_at, column).order_by(ReportSnapshot.id.desc()).limit(1)
+    )
+    return result.one_or_none()
+
+
+register_job(REPORT_JOB, build_report_snapshot, parse_times(REPORT_SCHEDULE), REPORT_CHANGE_THRESHOLD)
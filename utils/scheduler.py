@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, time as dtime
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.future import select
+from database.db import new_session
+from models import ScheduledJob
+
+# Планировщик фоновых задач внутри процесса приложения. Задача запускается:
+#  - по расписанию (время суток UTC, например "06:00,13:00") или с интервалом every;
+#  - после крупных изменений: change_version_seq ушёл вперёд на change_threshold;
+#  - по запросу пользователя (request_job).
+# Воркер захватывает задачу короткой транзакцией: строка берётся FOR UPDATE SKIP LOCKED,
+# в неё пишется аренда lease_until, и транзакция сразу коммитится. Пока аренда не истекла,
+# другие воркеры задачу не берут, а сама строка не заблокирована — запрос на внеочередной
+# запуск не ждёт окончания сборки. Аренда с запасом покрывает самую долгую сборку;
+# если воркер упал, задачу после её истечения подхватит другой.
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = float(os.getenv("SCHEDULER_POLL_SECONDS", 30))
+RETRY_DELAY = timedelta(minutes=5)
+LEASE = timedelta(minutes=int(os.getenv("SCHEDULER_LEASE_MINUTES", 30)))
+
+JOBS = {}
+wakeup = asyncio.Event()
+
+
+class Job:
+    def __init__(self, name: str, handler, times: list[dtime], change_threshold: int = 0,
+                 every: Optional[timedelta] = None):
+        self.name = name
+        self.handler = handler  # async def handler(db) — коммит делает планировщик
+        self.times = sorted(times)
+        self.change_threshold = change_threshold
+        self.every = every
+
+    def next_run(self, now: datetime):
+        if self.every:
+            return now + self.every
+        if not self.times:
+            return None
+        for at in self.times:
+            candidate = datetime.combine(now.date(), at)
+            if candidate > now:
+                return candidate
+        return datetime.combine(now.date() + timedelta(days=1), self.times[0])
+
+
+# "06:00,13:30" -> [time(6, 0), time(13, 30)]
+def parse_times(value: str) -> list[dtime]:
+    times = []
+    for part in value.split(","):
+        if part.strip():
+            hours, _, minutes = part.strip().partition(":")
+            times.append(dtime(int(hours), int(minutes or 0)))
+    return times
+
+
+def register_job(name: str, handler, times: list[dtime], change_threshold: int = 0,
+                 every: Optional[timedelta] = None):
+    JOBS[name] = Job(name, handler, times, change_threshold, every)
+
+
+async def current_change_version(db) -> int:
+    return (await db.execute(text("SELECT last_value FROM change_version_seq"))).scalar()
+
+
+# Внеочередной запуск: отметка в БД (её увидит любой воркер) и пробуждение своего цикла.
+# Один INSERT ... ON CONFLICT: строку создаёт, если планировщик её ещё не завёл, а уже
+# стоящую отметку не трогает
+async def request_job(db, name: str):
+    now = datetime.utcnow()
+    await db.execute(
+        insert(ScheduledJob)
+        .values(name=name, requested_at=now)
+        .on_conflict_do_update(
+            index_elements=["name"],
+            set_={"requested_at": now},
+            where=ScheduledJob.requested_at.is_(None)
+        )
+    )
+    await db.commit()
+    wakeup.set()
+
+
+async def get_job_state(db, name: str):
+    return (await db.execute(select(ScheduledJob).where(ScheduledJob.name == name))).scalar_one_or_none()
+
+
+async def ensure_jobs():
+    async with new_session() as db:
+        now = datetime.utcnow()
+        for job in JOBS.values():
+            await db.execute(
+                insert(ScheduledJob)
+                .values(name=job.name, next_run_at=job.next_run(now))
+                .on_conflict_do_nothing(index_elements=["name"])
+            )
+        await db.commit()
+
+
+# Захватить задачу, если она назрела: возвращает время старта и номер изменений на этот момент
+async def claim(job: Job):
+    async with new_session() as db:
+        state = (
+            await db.execute(
+                select(ScheduledJob).where(ScheduledJob.name == job.name).with_for_update(skip_locked=True)
+            )
+        ).scalar_one_or_none()
+        now = datetime.utcnow()
+        if state is None or (state.lease_until and state.lease_until > now):
+            return None  # задачу уже выполняет другой воркер
+
+        version = await current_change_version(db)
+        changed = (
+            job.change_threshold
+            and state.last_change_version is not None
+            and version - state.last_change_version >= job.change_threshold
+        )
+        never_run = state.last_finished_at is None and state.last_error is None
+        if not (state.requested_at or (state.next_run_at and state.next_run_at <= now) or changed or never_run):
+            return None
+
+        state.lease_until = now + LEASE
+        state.last_started_at = now
+        await db.commit()
+        return now, version
+
+
+# Выполнить задачу, если она назрела. Работа и отметка о завершении — одна транзакция
+async def run_if_due(job: Job):
+    claimed = await claim(job)
+    if claimed is None:
+        return
+    started, version = claimed
+
+    async with new_session() as db:
+        try:
+            await job.handler(db)
+        except Exception as exc:
+            logger.exception("Задача %s завершилась ошибкой", job.name)
+            await db.rollback()
+            await record_failure(job, exc)
+            return
+
+        state = await get_job_state(db, job.name)
+        state.last_finished_at = datetime.utcnow()
+        state.last_change_version = version
+        state.last_error = None
+        # Запрос, пришедший во время сборки, мог опоздать к данным — он запустит задачу ещё раз
+        if state.requested_at and state.requested_at <= started:
+            state.requested_at = None
+        state.next_run_at = job.next_run(state.last_finished_at)
+        state.lease_until = None
+        await db.commit()
+        logger.info("Задача %s выполнена за %.1f с", job.name, (state.last_finished_at - started).total_seconds())
+
+
+async def record_failure(job: Job, exc: Exception):
+    async with new_session() as db:
+        state = await get_job_state(db, job.name)
+        state.last_error = repr(exc)
+        state.requested_at = None
+        state.next_run_at = datetime.utcnow() + RETRY_DELAY
+        state.lease_until = None
+        await db.commit()
+
+
+async def scheduler_loop():
+    while True:
+        try:
+            await ensure_jobs()
+            break
+        except Exception:
+            logger.exception("Планировщик не смог зарегистрировать задачи, повтор через %s с", POLL_SECONDS)
+            await asyncio.sleep(POLL_SECONDS)
+
+    while True:
+        wakeup.clear()
+        for job in JOBS.values():
+            try:
+                await run_if_due(job)
+            except Exception:
+                logger.exception("Ошибка планировщика при запуске %s", job.name)
+        try:
+            await asyncio.wait_for(wakeup.wait(), POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_scheduler() -> asyncio.Task:
+    return asyncio.create_task(scheduler_loop(), name="scheduler")
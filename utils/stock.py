@@ -0,0 +1,249 @@
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import insert, delete, text, func, literal, null, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from models import StockPoint, StockRollup, Item, Category
+from utils.scheduler import register_job, get_job_state
+
+# История остатков для графиков. Каждое изменение товара пишет строку в stock_points
+# (на сколько изменились количество и стоимость), а задача планировщика сводит их
+# в остатки на конец часа и дня по рядам: товар, категория со всем поддеревом, весь склад.
+# Графики читают только stock_rollups.
+STOCK_JOB = "stock_rollup"
+ROLLUP_EVERY = timedelta(minutes=int(os.getenv("STOCK_ROLLUP_EVERY_MINUTES", 15)))
+# Час сводится, когда закончился и прошло ещё столько времени — на транзакции, записавшие
+# изменения в последние секунды часа, но не успевшие закоммититься
+ROLLUP_GRACE = timedelta(minutes=5)
+
+RAW_RETENTION = timedelta(days=int(os.getenv("STOCK_RAW_RETENTION_DAYS", 7)))
+HOURLY_RETENTION = timedelta(days=int(os.getenv("STOCK_HOURLY_RETENTION_DAYS", 90)))
+DAILY_RETENTION = timedelta(days=int(os.getenv("STOCK_DAILY_RETENTION_DAYS", 1825)))
+
+BUCKETS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+
+# Строки stock_points для изменения одного товара. old/new — (количество, цена, путь категории),
+# None — товара не было (создание) или не стало (удаление). При смене категории изменение
+# раскладывается на списание из старой и поступление в новую.
+def stock_change_points(item_id: int, old: Optional[tuple], new: Optional[tuple]) -> list[dict]:
+    recorded_at = datetime.utcnow()
+    old_qty, old_price, old_path = old or (0, 0.0, None)
+    new_qty, new_price, new_path = new or (0, 0.0, None)
+    old_value = (old_qty or 0) * (old_price or 0)
+    new_value = (new_qty or 0) * (new_price or 0)
+
+    if old_path == new_path:
+        if old_qty == new_qty and old_value == new_value:
+            return []
+        return [{"recorded_at": recorded_at, "item_id": item_id, "category_path": new_path,
+                 "qty_delta": (new_qty or 0) - (old_qty or 0), "value_delta": new_value - old_value}]
+    points = [
+        {"recorded_at": recorded_at, "item_id": item_id, "category_path": old_path,
+         "qty_delta": -(old_qty or 0), "value_delta": -old_value},
+        {"recorded_at": recorded_at, "item_id": item_id, "category_path": new_path,
+         "qty_delta": new_qty or 0, "value_delta": new_value},
+    ]
+    # Создание или удаление — одна из сторон пустая и строки не даёт
+    return [point for point in points if point["qty_delta"] or point["value_delta"]]
+
+
+# Запись идёт в той же транзакции, что и изменение товара
+async def record_stock_points(db: AsyncSession, points: list[dict]):
+    if points:
+        await db.execute(insert(StockPoint), points)
+
+
+# Пара строк на каждый товар, попавший под условие: остаток списывается с old_path и ставится
+# на new_path (одним INSERT ... SELECT; пути — выражения от категории товара)
+async def _record_moves(db: AsyncSession, condition, old_path, new_path):
+    recorded_at = literal(datetime.utcnow())
+    value = Item.quantity * Item.price
+    moved = select().join_from(Item, Category, Category.id == Item.category_id).where(condition, Item.quantity != 0)
+
+    await db.execute(
+        insert(StockPoint).from_select(
+            ["recorded_at", "item_id", "category_path", "qty_delta", "value_delta"],
+            union_all(
+                moved.add_columns(recorded_at, Item.id, old_path, -Item.quantity, -value),
+                moved.add_columns(recorded_at, Item.id, new_path, Item.quantity, value),
+            )
+        )
+    )
+
+
+# Перенос поддерева категорий меняет предков у всех его товаров: остаток каждого товара
+# переезжает со старого пути на новый. Вызывается до переписывания путей.
+# exclude_id — категория, которая сама не переносится (удаляемая, чьих детей поднимают выше)
+async def record_category_move(db: AsyncSession, old_prefix: str, new_prefix: str, exclude_id: Optional[int] = None):
+    condition = Category.path.startswith(old_prefix)
+    if exclude_id is not None:
+        condition &= Category.id != exclude_id
+    new_path = literal(new_prefix) + func.substr(Category.path, len(old_prefix) + 1)
+    await _record_moves(db, condition, Category.path, new_path)
+
+
+# Товары удаляемой категории остаются без категории: их остаток уходит из её ряда и рядов
+# предков. Вызывается до удаления
+async def record_category_removal(db: AsyncSession, category_id: int):
+    await _record_moves(db, Category.id == category_id, Category.path, null())
+
+
+# Изменения за [start, end) раскладываются по рядам, к остатку из stock_levels прибавляется
+# накопленная сумма изменений; на каждый час берутся остаток на конец, минимум и максимум
+HOURLY_ROLLUP = text("""
+WITH moves AS (
+    -- Перенос товара в другую категорию — две строки с одним временем; для самого товара,
+    -- общих предков и склада они взаимно гасятся и не дают ложного провала в минимуме
+    SELECT min(p.id) AS id, p.recorded_at, s.series, sum(p.qty_delta) AS qty_delta,
+           sum(p.value_delta) AS value_delta
+    FROM stock_points p
+    CROSS JOIN LATERAL (
+        SELECT 'item:' || p.item_id
+        UNION ALL SELECT 'total'
+        UNION ALL SELECT 'category:' || a
+        FROM unnest(string_to_array(trim(both '/' from coalesce(p.category_path, '')), '/')) a
+        WHERE a <> ''
+    ) s(series)
+    WHERE p.recorded_at >= :start AND p.recorded_at < :end
+    GROUP BY p.recorded_at, p.item_id, s.series
+),
+running AS (
+    SELECT
+        m.series,
+        date_trunc('hour', m.recorded_at) AS bucket_start,
+        m.qty_delta,
+        coalesce(l.quantity, 0) + sum(m.qty_delta) OVER w AS quantity,
+        coalesce(l.value, 0) + sum(m.value_delta) OVER w AS value,
+        row_number() OVER (
+            PARTITION BY m.series, date_trunc('hour', m.recorded_at) ORDER BY m.recorded_at DESC, m.id DESC
+        ) AS from_end
+    FROM moves m
+    LEFT JOIN stock_levels l ON l.series = m.series
+    WINDOW w AS (PARTITION BY m.series ORDER BY m.recorded_at, m.id)
+)
+INSERT INTO stock_rollups (bucket, series, bucket_start, quantity, value, quantity_min, quantity_max)
+SELECT
+    'hour',
+    series,
+    bucket_start,
+    max(quantity) FILTER (WHERE from_end = 1),
+    max(value) FILTER (WHERE from_end = 1),
+    min(least(quantity, quantity - qty_delta)),
+    max(greatest(quantity, quantity - qty_delta))
+FROM running
+GROUP BY series, bucket_start
+ON CONFLICT (bucket, series, bucket_start) DO UPDATE SET
+    quantity = EXCLUDED.quantity,
+    value = EXCLUDED.value,
+    quantity_min = EXCLUDED.quantity_min,
+    quantity_max = EXCLUDED.quantity_max
+""")
+
+UPDATE_LEVELS = text("""
+INSERT INTO stock_levels (series, quantity, value, as_of)
+SELECT DISTINCT ON (series) series, quantity, value, CAST(:end AS timestamp)
+FROM stock_rollups
+WHERE bucket = 'hour' AND bucket_start >= :start AND bucket_start < :end
+ORDER BY series, bucket_start DESC
+ON CONFLICT (series) DO UPDATE SET quantity = EXCLUDED.quantity, value = EXCLUDED.value, as_of = EXCLUDED.as_of
+""")
+
+# Дни сводятся из часов: остаток на конец последнего часа с изменениями, минимум и максимум за день
+DAILY_ROLLUP = text("""
+INSERT INTO stock_rollups (bucket, series, bucket_start, quantity, value, quantity_min, quantity_max)
+SELECT
+    'day',
+    series,
+    date_trunc('day', bucket_start),
+    (array_agg(quantity ORDER BY bucket_start DESC))[1],
+    (array_agg(value ORDER BY bucket_start DESC))[1],
+    min(quantity_min),
+    max(quantity_max)
+FROM stock_rollups
+WHERE bucket = 'hour' AND bucket_start >= :start AND bucket_start < :end
+GROUP BY series, date_trunc('day', bucket_start)
+ON CONFLICT (bucket, series, bucket_start) DO UPDATE SET
+    quantity = EXCLUDED.quantity,
+    value = EXCLUDED.value,
+    quantity_min = EXCLUDED.quantity_min,
+    quantity_max = EXCLUDED.quantity_max
+""")
+
+
+def hour_floor(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def day_floor(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+# Задача планировщика: свести закончившиеся часы и дни, удалить устаревшее
+async def rollup_stock(db: AsyncSession):
+    state = await get_job_state(db, STOCK_JOB)
+    end = hour_floor(datetime.utcnow() - ROLLUP_GRACE)
+    start = state.cursor_at
+    if start is None:
+        first = (await db.execute(select(func.min(StockPoint.recorded_at)))).scalar()
+        start = hour_floor(first) if first else end
+    if start >= end:
+        return
+
+    await db.execute(HOURLY_ROLLUP, {"start": start, "end": end})
+    await db.execute(UPDATE_LEVELS, {"start": start, "end": end})
+    if day_floor(end) > day_floor(start):
+        await db.execute(DAILY_ROLLUP, {"start": day_floor(start), "end": day_floor(end)})
+
+    await db.execute(delete(StockPoint).where(StockPoint.recorded_at < end - RAW_RETENTION))
+    await db.execute(
+        delete(StockRollup).where(StockRollup.bucket == "hour", StockRollup.bucket_start < end - HOURLY_RETENTION)
+    )
+    await db.execute(
+        delete(StockRollup).where(StockRollup.bucket == "day", StockRollup.bucket_start < end - DAILY_RETENTION)
+    )
+    state.cursor_at = end
+
+
+# Ряд для графика: по значению на каждый интервал [start, end), пропуски заполняются
+# предыдущим остатком
+async def load_series(db: AsyncSession, series: str, bucket: str, start: datetime, end: datetime):
+    step = BUCKETS[bucket]
+    result = await db.execute(
+        select(StockRollup.bucket_start, StockRollup.quantity, StockRollup.value)
+        .where(StockRollup.bucket == bucket, StockRollup.series == series,
+               StockRollup.bucket_start >= start, StockRollup.bucket_start < end)
+        .order_by(StockRollup.bucket_start)
+    )
+    rows = {bucket_start: (quantity, value) for bucket_start, quantity, value in result.all()}
+
+    # Остаток на начало периода — последняя строка до него (часы могли уже уйти по сроку хранения,
+    # тогда берём день)
+    base = None
+    for base_bucket in dict.fromkeys([bucket, "day"]):
+        base = (
+            await db.execute(
+                select(StockRollup.quantity, StockRollup.value)
+                .where(StockRollup.bucket == base_bucket, StockRollup.series == series,
+                       StockRollup.bucket_start < start)
+                .order_by(StockRollup.bucket_start.desc())
+                .limit(1)
+            )
+        ).one_or_none()
+        if base:
+            break
+    quantity, value = base if base else (0, 0.0)
+
+    labels, quantities, values = [], [], []
+    moment = start
+    while moment < end:
+        quantity, value = rows.get(moment, (quantity, value))
+        labels.append(moment)
+        quantities.append(quantity)
+        values.append(round(value, 2))
+        moment += step
+    return {"labels": labels, "quantity": quantities, "value": values}
+
+
+register_job(STOCK_JOB, rollup_stock, [], every=ROLLUP_EVERY)
@@ -0,0 +1,5 @@
+from fastapi.templating import Jinja2Templates
+
+# Одно окружение шаблонов на всё приложение: скомпилированные шаблоны кэшируются в нём,
+# и прогрев при старте (main.lifespan) действует на все роутеры
+templates = Jinja2Templates(directory="templates")
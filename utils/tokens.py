@@ -0,0 +1,33 @@
+import os
+from typing import Optional
+from dotenv import load_dotenv
+from fastapi import Request
+from jose import JWTError, jwt
+
+# Токены доступа: где их искать в запросе и как проверять. Общие для авторизации (auth.py)
+# и ограничения нагрузки (utils/admission.py), чтобы ключ и алгоритм были заданы в одном месте.
+load_dotenv()
+SECRET_KEY = os.getenv("SECRET_KEY")
+if not SECRET_KEY:
+    raise ValueError("SECRET_KEY is not set in environment variables")
+
+ALGORITHM = "HS256"
+
+
+# Токен из cookie (браузер) или из заголовка Authorization: Bearer (интеграции через /api/v1)
+def get_token(request: Request) -> Optional[str]:
+    token = request.cookies.get("access_token")
+    if not token:
+        scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and credentials:
+            token = credentials
+    return token
+
+
+# Имя пользователя из токена; None — подпись или срок не прошли проверку либо в токене нет sub
+def decode_token(token: str) -> Optional[str]:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
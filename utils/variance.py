@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+# Расчёты аналитики расхождений на NumPy/pandas. Модуль импортируется лениво из analytics.py,
+# чтобы pandas не загружался при старте приложения.
+
+CHRONIC_WINDOW = 6         # сколько последних инвентаризаций смотрим
+CHRONIC_MIN_INVENTORIES = 3  # в скольких из них должно быть отклонение
+VAR_LEVEL = 0.95           # уровень для оценки риска потерь
+
+
+# Сводка одной проведённой инвентаризации — всё, что нужно дашборду, без строк:
+# итоги для динамики, недостача по категориям (-1 — без категории) и отклонения по товарам.
+# Строится из агрегатов, посчитанных в БД:
+#   category_rows — (inventory_id, category_id, недостача ₽, отклонение ₽, позиций)
+#   item_rows — (inventory_id, item_id, отклонение шт., отклонение ₽) по строкам корректировок
+def build_summaries(inv_ids: list[int], category_rows, item_rows) -> dict:
+    summaries = {
+        inv_id: {"shortage": 0.0, "net": 0.0, "lines": 0, "categories": {}, "items": empty_items()}
+        for inv_id in inv_ids
+    }
+    for inv_id, category_id, shortage, net, lines in category_rows:
+        summary = summaries[inv_id]
+        summary["shortage"] += float(shortage)
+        summary["net"] += float(net)
+        summary["lines"] += int(lines)
+        summary["categories"][-1 if category_id is None else category_id] = float(shortage)
+
+    # Отклонения по товарам храним столбцами (так сводка занимает меньше памяти)
+    # и раскладываем по инвентаризациям без цикла по строкам
+    if item_rows:
+        columns = [np.asarray(col) for col in zip(*item_rows)]
+        inventory_ids = columns[0].astype(np.int64)
+        order = np.argsort(inventory_ids, kind="stable")
+        bounds = np.flatnonzero(np.diff(inventory_ids[order])) + 1
+        for chunk in np.split(order, bounds):
+            summaries[int(inventory_ids[chunk[0]])]["items"] = {
+                "item_id": columns[1][chunk].astype(np.int64),
+                "difference": columns[2][chunk].astype(np.int64),
+                "value": columns[3][chunk].astype(np.float64),
+            }
+    return summaries
+
+
+def empty_items() -> dict:
+    return {
+        "item_id": np.array([], dtype=np.int64),
+        "difference": np.array([], dtype=np.int64),
+        "value": np.array([], dtype=np.float64),
+    }
+
+
+# Динамика по инвентаризациям: недостача и общее отклонение в ₽
+def inventory_trend(summaries: dict, inventories: list[dict]) -> list[dict]:
+    return [
+        {
+            **inv,
+            "shortage": summaries[inv["id"]]["shortage"],
+            "net": summaries[inv["id"]]["net"],
+            "lines": summaries[inv["id"]]["lines"],
+        }
+        for inv in inventories
+    ]
+
+
+# Тренд недостачи по категориям: наклон линейной регрессии по последовательности инвентаризаций
+def category_trends(summaries: dict, inv_ids: list[int], category_names: dict) -> list[dict]:
+    matrix = pd.DataFrame.from_dict(
+        {inv_id: summaries[inv_id]["categories"] for inv_id in inv_ids}, orient="index"
+    ).reindex(inv_ids).fillna(0.0)
+    if matrix.columns.empty:
+        return []
+
+    values = matrix.to_numpy(dtype=np.float64)
+    x = np.arange(len(inv_ids), dtype=np.float64)
+    if len(inv_ids) > 1:
+        slopes = np.polyfit(x, values, 1)[0]
+    else:
+        slopes = np.zeros(values.shape[1])
+
+    trends = []
+    for idx, category_id in enumerate(matrix.columns):
+        column = values[:, idx]
+        trends.append({
+            "category": "Без категории" if category_id == -1 else category_names.get(int(category_id), "-"),
+            "total": float(column.sum()),
+            "average": float(column.mean()),
+            "last": float(column[-1]),
+            "slope": float(slopes[idx]),
+        })
+    trends.sort(key=lambda row: row["total"], reverse=True)
+    return trends
+
+
+# Товары с расхождениями в большинстве последних инвентаризаций
+def chronic_items(summaries: dict, inv_ids: list[int]) -> pd.DataFrame:
+    window = [summaries[inv_id]["items"] for inv_id in inv_ids[-CHRONIC_WINDOW:]] or [empty_items()]
+    frame = pd.DataFrame({
+        "inventory_id": np.concatenate(
+            [np.full(len(items["item_id"]), idx, dtype=np.int64) for idx, items in enumerate(window)]
+        ),
+        **{column: np.concatenate([items[column] for items in window]) for column in empty_items()},
+    })
+    if frame.empty:
+        return frame
+
+    stats = frame.groupby("item_id").agg(
+        inventories=("inventory_id", "nunique"),
+        difference=("difference", "sum"),
+        value=("value", "sum"),
+    )
+    stats = stats[stats["inventories"] >= CHRONIC_MIN_INVENTORIES]
+    return stats.sort_values("value")
+
+
+# Историческая оценка риска: потери, которые не будут превышены с вероятностью VAR_LEVEL
+def value_at_risk(trend: list[dict]) -> dict:
+    losses = np.array([row["shortage"] for row in trend], dtype=np.float64)
+    if losses.size == 0:
+        return {"var": 0.0, "expected_shortfall": 0.0, "mean": 0.0}
+
+    var = float(np.quantile(losses, VAR_LEVEL))
+    tail = losses[losses >= var]
+    return {
+        "var": var,
+        "expected_shortfall": float(tail.mean()) if tail.size else var,
+        "mean": float(losses.mean()),
+    }